@@ -0,0 +1,147 @@
+"""
+asyncio front-end for tamper chains (Python 3.6+)
+
+Cheap chains are run inline inside the event loop, while chains estimated
+(by mytemper.chaincost) to be more expensive than a given threshold are
+offloaded to an executor, so payload generation does not stall request I/O
+"""
+
+import asyncio
+import collections
+import functools
+
+from mytemper import TAMPER_STATS
+from mytemper import chaincost
+from mytemper import tamperchain
+from mytemper import tamperproperties
+
+# Chains estimated to run longer than this (in seconds) are offloaded to executor
+DEFAULT_OFFLOAD_THRESHOLD = 0.0005
+
+class AsyncTamperChain(object):
+    """
+    Runs a chain of tampers (names) from asyncio code
+
+    >>> chain = AsyncTamperChain(('space2comment', 'charencode'))
+    >>> asyncio.run(chain.tamper('1 AND 1=1'))
+    '%31%2F%2A%2A%2F%41%4E%44%2F%2A%2A%2F%31%3D%31'
+    """
+
+    def __init__(self, tampers, threshold=DEFAULT_OFFLOAD_THRESHOLD, executor=None):
+        self.threshold = threshold
+        self.executor = executor
+
+        # header-only tampers are cheap and must modify caller's headers (not executor's copy)
+        self.headers = tuple(_ for _ in tampers if tamperproperties(_)["headers"])
+        self.stages = tuple(_ for _ in tampers if not tamperproperties(_)["headers"])
+
+    async def tamper(self, payload, **kwargs):
+        """
+        Returns tampered payload (offloading expensive chains to executor)
+        """
+
+        tamperchain(payload, self.headers, **kwargs)
+
+        if chaincost(self.stages, len(payload or "")) <= self.threshold:
+            return tamperchain(payload, self.stages, **kwargs)
+
+        # executor copy of headers is not going back (payload stages do not use them)
+        kwargs.pop("headers", None)
+
+        retVal = await self._offload((payload,), kwargs)
+
+        return retVal[0]
+
+    async def tamperbatch(self, payloads, **kwargs):
+        """
+        Returns list of tampered payloads (offloading expensive batches to executor)
+        """
+
+        payloads = list(payloads)
+
+        for _ in payloads:
+            tamperchain(_, self.headers, **kwargs)
+
+        if chaincost(self.stages, sum(len(_ or "") for _ in payloads)) <= self.threshold:
+            return _tamperbatch(payloads, self.stages, kwargs)
+
+        kwargs.pop("headers", None)
+
+        return await self._offload(payloads, kwargs)
+
+    async def _offload(self, payloads, kwargs):
+        """
+        Returns tampered payloads from executor, merging statistics collected
+        there into TAMPER_STATS (inside of the event loop thread)
+        """
+
+        retVal, statistics = await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(_tamperbatch, payloads, self.stages, kwargs, True))
+
+        for name, values in statistics.items():
+            stats = TAMPER_STATS.setdefault(name, [0, 0, 0.0, 0])
+
+            for i in range(len(stats)):
+                stats[i] += values[i]
+
+        return retVal
+
+    async def stream(self, payloads, batchsize=64, depth=2, **kwargs):
+        """
+        Asynchronously yields batches (lists) of tampered payloads from a
+        given (synchronous or asynchronous) iterable, keeping at most depth
+        batches in flight (backpressure) and cancelling them if the consumer
+        stops early
+
+        >>> async def main():
+        ...     return [_ async for _ in AsyncTamperChain(('space2plus',)).stream(('1 AND 1=1', '2 OR 2'), batchsize=1)]
+        >>> asyncio.run(main())
+        [['1+AND+1=1'], ['2+OR+2']]
+        """
+
+        pending = collections.deque()
+        batch = []
+
+        try:
+            async for payload in _aiter(payloads):
+                batch.append(payload)
+
+                if len(batch) >= batchsize:
+                    pending.append(asyncio.ensure_future(self.tamperbatch(batch, **kwargs)))
+                    batch = []
+
+                    if len(pending) >= depth:
+                        yield await pending.popleft()
+
+            if batch:
+                pending.append(asyncio.ensure_future(self.tamperbatch(batch, **kwargs)))
+
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for _ in pending:
+                _.cancel()
+
+def _tamperbatch(payloads, tampers, kwargs, offloaded=False):
+    """
+    Runs each of given payloads through a chain of tampers (executor entry
+    point returning also the statistics collected by the batch)
+    """
+
+    if not offloaded:
+        return [tamperchain(_, tampers, **kwargs) for _ in payloads]
+
+    statistics = {}
+
+    return [tamperchain(_, tampers, statistics=statistics, **kwargs) for _ in payloads], statistics
+
+async def _aiter(iterable):
+    """
+    Asynchronously iterates over a synchronous or asynchronous iterable
+    """
+
+    if hasattr(iterable, "__aiter__"):
+        async for _ in iterable:
+            yield _
+    else:
+        for _ in iterable:
+            yield _
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+"""
+Vectorized (NumPy) batch backend for percent-encoding tampers
+
+Batch of payloads is packed into a contiguous uint8 array (with offsets),
+already encoded (%XX) sequences are detected with array operations and
+output is scattered through lookup tables. Without NumPy (or for payloads
+with characters outside of latin1) it falls back to the scalar tampers.
+Batches of base64encode call binascii directly
+"""
+
+import binascii
+import optparse
+import random
+
+import mytemper
+
+from mytemper import URLSAFE_BASE64_TABLE
+from mytemper import _isbytes
+from mytemper import _text
+from mytemper import _timer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Output layout of supported tampers: (prefix of encoded characters, whether already encoded ones keep their '%')
+VECTORIZED_TAMPERS = {
+    "charencode": (b"%", True),
+    "chardoubleencode": (b"%25", False),
+    "charunicodeencode": (b"%u00", False),
+    "percentage": (b"%", True),
+}
+
+# Size (in bytes) of chunks huge payloads get base64 encoded in (multiple of 3 for alignment)
+BASE64_CHUNK_SIZE = 3 * 16384
+
+if numpy is not None:
+    _HEX_DIGITS = numpy.frombuffer(b"0123456789ABCDEF", dtype=numpy.uint8)
+    _HEX_HIGH = _HEX_DIGITS[numpy.arange(256) >> 4]
+    _HEX_LOW = _HEX_DIGITS[numpy.arange(256) & 0xf]
+    _IS_HEX = numpy.zeros(256, dtype=bool)
+    _IS_HEX[numpy.frombuffer(b"0123456789abcdefABCDEF", dtype=numpy.uint8)] = True
+
+def _vectorized(payloads, name):
+    """
+    Returns tampered (bytes or latin1 encodable, non-empty) payloads using
+    array operations (bytes-like payloads result in bytes)
+    """
+
+    prefix, keep = VECTORIZED_TAMPERS[name]
+    encoded = [bytes(_) if _isbytes(_) else _.encode("latin1") for _ in payloads]
+    lengths = numpy.array([len(_) for _ in encoded], dtype=numpy.int64)
+    ends = numpy.cumsum(lengths)
+    data = numpy.frombuffer(b"".join(encoded) + b"\0\0", dtype=numpy.uint8)
+    size = int(ends[-1])
+
+    # escape (%XX) starts, not crossing the end of their own payload
+    positions = numpy.arange(size)
+    escape = (data[:size] == ord('%')) & _IS_HEX[data[1:size + 1]] & _IS_HEX[data[2:size + 2]] & (positions + 2 < numpy.repeat(ends, lengths))
+
+    covered = numpy.zeros(size + 2, dtype=bool)
+    covered[1:size + 1] |= escape
+    covered[2:size + 2] |= escape
+    units = numpy.flatnonzero(~covered[:size])
+    escaped = escape[units]
+    values = data[units]
+
+    if name == "percentage":
+        width = 3
+        matrix = numpy.empty((len(units), width), dtype=numpy.uint8)
+        matrix[:, 0] = numpy.where(values == ord(' '), ord(' '), ord('%'))
+        matrix[:, 1] = numpy.where(escaped, data[units + 1], values)
+        matrix[:, 2] = data[units + 2]
+        widths = numpy.where(escaped, 3, numpy.where(values == ord(' '), 1, 2))
+    else:
+        width = len(prefix) + 2
+        matrix = numpy.empty((len(units), width), dtype=numpy.uint8)
+        matrix[:, :len(prefix)] = numpy.frombuffer(prefix, dtype=numpy.uint8)
+        matrix[:, -2] = numpy.where(escaped, data[units + 1], _HEX_HIGH[values])
+        matrix[:, -1] = numpy.where(escaped, data[units + 2], _HEX_LOW[values])
+        widths = numpy.where(escaped, 3 if keep else width, width)
+
+        if keep:
+            matrix[escaped, 1:3] = matrix[escaped, -2:]
+
+    output = matrix[numpy.arange(width) < widths[:, None]].tobytes()
+    sizes = numpy.bincount(numpy.searchsorted(ends, units, side="right"), weights=widths, minlength=len(payloads)).astype(numpy.int64)
+    offsets = numpy.concatenate(([0], numpy.cumsum(sizes)))
+
+    if not any(_isbytes(_) for _ in payloads):
+        output = output.decode("latin1")
+        return [output[offsets[i]:offsets[i + 1]] for i in range(len(payloads))]
+
+    return [output[offsets[i]:offsets[i + 1]] if _isbytes(payloads[i]) else output[offsets[i]:offsets[i + 1]].decode("latin1") for i in range(len(payloads))]
+
+class Base64Encoder(object):
+    """
+    Batch (and streaming) base64 encoder calling binascii directly for each
+    payload, where huge payloads can be streamed in 3-byte aligned chunks
+    and URL-safe alphabet and omitting of padding are done in place (no
+    separate urlencode pass needed). As with base64encode, str payloads
+    result in str and bytes ones in bytes
+
+    >>> encoder = Base64Encoder(urlsafe=True, padding=False)
+    >>> encoder.encode(["1' AND SLEEP(5)#", b'\\xfb\\xff'])
+    ['MScgQU5EIFNMRUVQKDUpIw', b'-_8']
+    >>> "".join(encoder.stream(("1' AND ", "SLEEP(5)#")))
+    'MScgQU5EIFNMRUVQKDUpIw'
+    >>> "".join(Base64Encoder(chunksize=3).stream("1' AND SLEEP(5)#"))
+    'MScgQU5EIFNMRUVQKDUpIw=='
+    """
+
+    def __init__(self, urlsafe=False, padding=True, chunksize=BASE64_CHUNK_SIZE):
+        if chunksize % 3:
+            raise ValueError("chunk size has to be a multiple of 3")
+
+        self.urlsafe = urlsafe
+        self.padding = padding
+        self.chunksize = chunksize
+
+    def _encode(self, data, padding=True):
+        """
+        Returns base64 encoded bytes for each of given bytes values
+        """
+
+        b2a = binascii.b2a_base64
+        retVal = [b2a(_)[:-1] for _ in data]
+
+        if self.urlsafe:
+            retVal = [_.translate(URLSAFE_BASE64_TABLE) for _ in retVal]
+
+        if not padding:
+            retVal = [_.rstrip(b"=") for _ in retVal]
+
+        return retVal
+
+    def encode(self, payloads):
+        """
+        Returns base64 encoded payloads
+        """
+
+        payloads = list(payloads)
+        encoding = mytemper.UNICODE_ENCODING
+
+        if not any(isinstance(_, (bytes, bytearray)) for _ in payloads):
+            if not self.urlsafe and self.padding and str is not bytes:
+                b2a = binascii.b2a_base64
+                return [b2a(_.encode(encoding))[:-1].decode("ascii") for _ in payloads]
+
+            retVal = self._encode([_.encode(encoding) for _ in payloads], self.padding)
+
+            return [_.decode("ascii") for _ in retVal] if str is not bytes else retVal
+
+        retVal = self._encode([bytes(_) if _isbytes(_) else _.encode(encoding) for _ in payloads], self.padding)
+
+        return [_ if _isbytes(payload) else _text(_) for payload, _ in zip(payloads, retVal)]
+
+    def stream(self, chunks):
+        """
+        Yields base64 encoded pieces of a huge payload, given either as is
+        (encoded in chunks of chunksize) or as chunks of arbitrary sizes
+        (leftover bytes are carried over to keep 3-byte alignment, so
+        padding can occur only at the very end)
+        """
+
+        if isinstance(chunks, (bytes, bytearray, type(u""))):
+            payload = chunks
+            chunks = (payload[_:_ + self.chunksize] for _ in range(0, len(payload), self.chunksize))
+
+        carry, text = b"", True
+
+        for chunk in chunks:
+            text = not _isbytes(chunk)
+            carry += chunk.encode(mytemper.UNICODE_ENCODING) if text else bytes(chunk)
+            cut = len(carry) - len(carry) % 3
+
+            if cut:
+                _ = self._encode((carry[:cut],))[0]
+                carry = carry[cut:]
+                yield _text(_) if text else _
+
+        if carry:
+            _ = self._encode((carry,), self.padding)[0]
+            yield _text(_) if text else _
+
+def batchencode(payloads, name, vectorized=True):
+    """
+    Returns given payloads run through a (percent-encoding) tamper
+
+    >>> batchencode(['SELECT%20A', '', 'B C'], 'chardoubleencode')
+    ['%2553%2545%254C%2545%2543%2554%2520%2541', '', '%2542%2520%2543']
+    """
+
+    function = getattr(mytemper, name)
+    retVal = list(payloads)
+
+    if vectorized and name == "base64encode":
+        return Base64Encoder().encode(retVal)
+
+    if not (vectorized and numpy is not None and name in VECTORIZED_TAMPERS):
+        return [function(_) if _ else _ for _ in retVal]
+
+    indexes = []
+
+    for i in range(len(retVal)):
+        if retVal[i]:
+            try:
+                if not _isbytes(retVal[i]):
+                    retVal[i].encode("latin1")
+                indexes.append(i)
+            except UnicodeError:
+                retVal[i] = function(retVal[i])
+
+    if indexes:
+        for i, _ in zip(indexes, _vectorized([retVal[_] for _ in indexes], name)):
+            retVal[i] = _
+
+    return retVal
+
+def benchmark(count=100000, length=64, seed=0):
+    """
+    Returns (tamper, scalar seconds, vectorized seconds) for a random batch
+    """
+
+    random.seed(seed)
+    alphabet = "SELECTFROMWHEREabc0123456789 %%'\"=(),"
+    payloads = ["".join(random.choice(alphabet) for _ in range(random.randint(1, 2 * length))) for _ in range(count)]
+    retVal = []
+
+    for name in sorted(tuple(VECTORIZED_TAMPERS) + ("base64encode",)):
+        start = _timer()
+        scalar = batchencode(payloads, name, vectorized=False)
+        middle = _timer()
+        vectorized = batchencode(payloads, name)
+        end = _timer()
+
+        if scalar != vectorized:
+            raise AssertionError("results of '%s' differ" % name)
+
+        retVal.append((name, middle - start, end - middle))
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--count", type="int", default=100000, help="Number of payloads in batch (default 100000)")
+    parser.add_option("--length", type="int", default=64, help="Average payload length (default 64)")
+    options, _ = parser.parse_args()
+
+    if numpy is None:
+        print("[!] NumPy is not available (only scalar implementation is used)")
+
+    print("%-20s %12s %14s %9s" % ("tamper", "scalar (s)", "vectorized (s)", "speedup"))
+
+    for name, scalar, vectorized in benchmark(options.count, options.length):
+        print("%-20s %12.3f %14.3f %9.1f" % (name, scalar, vectorized, scalar / vectorized))
+
+if __name__ == "__main__":
+    main()
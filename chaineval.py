@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""
+Multi-core evaluation of tamper chains against a (local) WAF rule set over
+a payload corpus
+
+(chain, payload) pairs are sharded across worker processes. The compiled
+rule set, corpus, chains, keyword set (kb.keywords) and keyword rewrite
+tables are set up before the pool gets forked, hence are shared
+copy-on-write, and workers send back per-chain aggregates instead of
+per-item results
+"""
+
+import multiprocessing
+import optparse
+import random
+import time
+
+from mytemper import prebuildkeywords
+from mytemper import tamperchain
+
+# Default number of payloads per shard
+DEFAULT_SHARD_SIZE = 256
+
+# Context (WAF, payloads, chains) shared with worker processes
+_context = {}
+
+def _init(context):
+    _context.update(context)
+
+def _evaluate(shard):
+    """
+    Evaluates a shard (chain index, payload slice), returning aggregates
+    (chain index, total, passed, bytes, seconds)
+    """
+
+    index, start, end = shard
+    waf, payloads, chain = _context["waf"], _context["payloads"], _context["chains"][index]
+    passed = length = 0
+    random.seed(_context["seed"] + start)
+    begin = time.time()
+
+    for payload in payloads[start:end]:
+        value = tamperchain(payload, chain, headers={})
+
+        if isinstance(value, (bytes, bytearray)) and not isinstance(value, str):
+            value = value.decode("latin1")
+
+        length += len(value or "")
+        passed += not waf.blocks(value)
+
+    return index, end - start, passed, length, time.time() - begin
+
+def evaluate(chains, payloads, waf, workers=None, shardsize=DEFAULT_SHARD_SIZE, seed=0):
+    """
+    Returns list of (chain, total, passed, bytes, seconds) aggregates for
+    given chains over payload corpus
+    """
+
+    chains = [tuple(_) for _ in chains]
+    context = dict(waf=waf, payloads=tuple(payloads), chains=chains, seed=seed)
+    shards = [(i, _, min(_ + shardsize, len(payloads))) for i in range(len(chains)) for _ in range(0, len(payloads), shardsize)]
+    retVal = [[chain, 0, 0, 0, 0.0] for chain in chains]
+
+    prebuildkeywords()
+
+    if workers == 1:
+        _init(context)
+        results = (_evaluate(_) for _ in shards)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, _init, (context,))
+        results = pool.imap_unordered(_evaluate, shards)
+
+    try:
+        for index, total, passed, length, elapsed in results:
+            aggregate = retVal[index]
+            aggregate[1] += total
+            aggregate[2] += passed
+            aggregate[3] += length
+            aggregate[4] += elapsed
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return [tuple(_) for _ in retVal]
+
+def benchmark(chains, payloads, waf, shardsize=DEFAULT_SHARD_SIZE):
+    """
+    Returns (workers, pairs per second, speedup) for increasing number of workers
+    """
+
+    retVal = []
+    workers = 1
+
+    while True:
+        start = time.time()
+        evaluate(chains, payloads, waf, workers, shardsize)
+        rate = len(chains) * len(payloads) / (time.time() - start)
+        retVal.append((workers, rate, rate / retVal[0][1] if retVal and retVal[0][1] else 1.0))
+
+        if workers >= multiprocessing.cpu_count():
+            break
+
+        workers = min(workers * 2, multiprocessing.cpu_count())
+
+    return retVal
+
+def main():
+    from mockwaf import DEFAULT_PAYLOADS
+    from mockwaf import MockWaf
+    from mockwaf import WAF_RULESETS
+
+    parser = optparse.OptionParser(usage="%prog [options] chain [chain ...]  (e.g. space2comment,charencode)")
+    parser.add_option("--ruleset", default="crs", choices=sorted(WAF_RULESETS), help="Rule set to use (%s)" % ", ".join(sorted(WAF_RULESETS)))
+    parser.add_option("--decode", type="int", default=1, help="Number of url-decoding passes done by WAF (default 1)")
+    parser.add_option("--payloads", help="File with payloads (one per line)")
+    parser.add_option("--multiply", type="int", default=1000, help="Number of copies of (default) payloads in corpus (default 1000)")
+    parser.add_option("--workers", type="int", help="Number of worker processes (default: number of CPUs)")
+    parser.add_option("--benchmark", action="store_true", help="Measure scaling over number of workers")
+    options, args = parser.parse_args()
+
+    if options.payloads:
+        with open(options.payloads) as f:
+            payloads = [_.rstrip("\r\n") for _ in f if _.strip()]
+    else:
+        payloads = list(DEFAULT_PAYLOADS) * options.multiply
+
+    waf = MockWaf(options.ruleset, options.decode)
+    chains = [tuple(_ for _ in chain.split(',') if _) for chain in (args or [""])]
+
+    if options.benchmark:
+        print("%8s %14s %9s" % ("workers", "pairs/sec", "speedup"))
+
+        for workers, rate, speedup in benchmark(chains, payloads, waf):
+            print("%8d %14.1f %9.2f" % (workers, rate, speedup))
+    else:
+        print("%-48s %9s %9s %11s %13s" % ("chain", "payloads", "pass %", "bytes/req", "usec/payload"))
+
+        for chain, total, passed, length, elapsed in evaluate(chains, payloads, waf, options.workers):
+            print("%-48s %9d %9.1f %11.1f %13.1f" % (",".join(chain) or "-", total, 100.0 * passed / max(1, total), 1.0 * length / max(1, total), 1e6 * elapsed / max(1, total)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+Search for the cheapest tamper chain passing a (local) WAF oracle
+
+Chains are explored depth-first, so intermediate (transformed) payloads
+get computed once for all chains sharing a prefix. Chains are pruned if
+the last stage is a no-op, if the same transformed payloads (i.e. same
+bytes) were already reached by a chain with no more stages and no more CPU
+(dominated), if commuting stages are not in canonical order, or if a
+(shorter) prefix already passes. Passing chains are ranked by fewest bytes
+and least CPU per payload
+"""
+
+import optparse
+import random
+
+import mytemper
+
+from mytemper import _commute
+from mytemper import _timer
+from mytemper import tamperproperties
+
+class ChainSearch(object):
+    """
+    Pruned (depth-first) search over chains of tampers
+
+    >>> from mockwaf import MockWaf
+    >>> waf = MockWaf("weak")
+    >>> search = ChainSearch(("1 UNION SELECT 1",), lambda _: not waf.blocks(_), maxlength=1)
+    >>> search.run()[0][0]
+    ('space2plus',)
+    """
+
+    def __init__(self, payloads, oracle, tampers=None, maxlength=3, passrate=1.0, seed=0):
+        self.payloads = tuple(payloads)
+        self.oracle = oracle
+        self.tampers = sorted(tampers or (_ for _ in mytemper.TAMPER_PROPERTIES if not tamperproperties(_)["headers"]))
+        self.properties = dict((_, tamperproperties(_)) for _ in self.tampers)
+        self.maxlength = maxlength
+        self.passrate = passrate
+        self.seed = seed
+        self.results = {}
+        self.stats = dict(evaluated=0, noop=0, dominated=0, canonical=0, broken=0)
+        self._seen = {}
+
+    def _passrate(self, payloads):
+        passed = 0
+
+        for _ in payloads:
+            if isinstance(_, (bytes, bytearray)) and not isinstance(_, str):
+                _ = _.decode("latin1")
+
+            passed += bool(self.oracle(_))
+
+        return 1.0 * passed / len(payloads)
+
+    def _dominated(self, payloads, length, cpu):
+        """
+        Checks if given payloads were already reached by a chain with no more
+        stages and no more CPU (otherwise they get recorded)
+        """
+
+        front = self._seen.setdefault(payloads, [])
+
+        if any(_[0] <= length and _[1] <= cpu for _ in front):
+            return True
+
+        front[:] = [_ for _ in front if not (length <= _[0] and cpu <= _[1])] + [(length, cpu)]
+
+        return False
+
+    def _search(self, chain, payloads, cpu):
+        for name in self.tampers:
+            if name in chain:
+                continue
+
+            # out of all orders of commuting (adjacent) stages only one is explored
+            if chain and name < chain[-1] and _commute(self.properties[chain[-1]], self.properties[name]):
+                self.stats["canonical"] += 1
+                continue
+
+            function = getattr(mytemper, name)
+            random.seed(self.seed)
+            start = _timer()
+
+            try:
+                current = tuple(function(_) for _ in payloads)
+            except (AttributeError, TypeError):
+                # text-only tampers fail on bytes-like payloads (anything else is a bug)
+                if not any(isinstance(_, (bytes, bytearray)) and not isinstance(_, str) for _ in payloads):
+                    raise
+
+                self.stats["broken"] += 1
+                continue
+
+            elapsed = cpu + _timer() - start
+            self.stats["evaluated"] += 1
+
+            if current == payloads:
+                self.stats["noop"] += 1
+                continue
+
+            if self._dominated(current, len(chain) + 1, elapsed):
+                self.stats["dominated"] += 1
+                continue
+
+            rate = self._passrate(current)
+
+            if rate >= self.passrate:
+                # out of passing chains with the same output (bytes) the cheapest one is kept
+                if current not in self.results or elapsed / len(current) < self.results[current][2]:
+                    self.results[current] = (chain + (name,), 1.0 * sum(len(_) for _ in current) / len(current), elapsed / len(current), rate)
+            elif len(chain) + 1 < self.maxlength:
+                self._search(chain + (name,), current, elapsed)
+
+    def run(self):
+        """
+        Returns passing chains as (chain, bytes per payload, seconds per
+        payload, pass rate) tuples, the cheapest first
+        """
+
+        self.results.clear()
+        self._seen.clear()
+
+        if self._passrate(self.payloads) >= self.passrate:
+            self.results[self.payloads] = ((), 1.0 * sum(len(_) for _ in self.payloads) / len(self.payloads), 0.0, 1.0)
+        else:
+            self._search((), self.payloads, 0.0)
+
+        return sorted(self.results.values(), key=lambda _: (round(_[1], 1), _[2]))
+
+def main():
+    from mockwaf import DEFAULT_PAYLOADS
+    from mockwaf import MockWaf
+    from mockwaf import WAF_RULESETS
+
+    parser = optparse.OptionParser()
+    parser.add_option("--ruleset", default="crs", choices=sorted(WAF_RULESETS), help="Rule set to use (%s)" % ", ".join(sorted(WAF_RULESETS)))
+    parser.add_option("--decode", type="int", default=1, help="Number of url-decoding passes done by WAF (default 1)")
+    parser.add_option("--payloads", help="File with payloads (one per line)")
+    parser.add_option("--max-length", dest="maxlength", type="int", default=3, help="Maximum chain length (default 3)")
+    parser.add_option("--pass-rate", dest="passrate", type="float", default=1.0, help="Required pass rate (default 1.0)")
+    parser.add_option("--top", type="int", default=10, help="Number of chains to show (default 10)")
+    options, _ = parser.parse_args()
+
+    if options.payloads:
+        with open(options.payloads) as f:
+            payloads = [_.rstrip("\r\n") for _ in f if _.strip()]
+    else:
+        payloads = DEFAULT_PAYLOADS
+
+    waf = MockWaf(options.ruleset, options.decode)
+    search = ChainSearch(payloads, lambda _: not waf.blocks(_), maxlength=options.maxlength, passrate=options.passrate)
+    results = search.run()
+
+    print("%-60s %11s %13s %9s" % ("chain", "bytes/req", "usec/payload", "pass %"))
+
+    for chain, length, cpu, rate in results[:options.top]:
+        print("%-60s %11.1f %13.1f %9.1f" % (",".join(chain) or "-", length, 1e6 * cpu, 100 * rate))
+
+    print("\n%s" % ", ".join("%s: %d" % _ for _ in sorted(search.stats.items())))
+
+if __name__ == "__main__":
+    main()
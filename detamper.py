@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+"""
+Bulk inverse ("detamper") normalizer for payloads found in WAF logs
+
+Reverses transformation families of tampers (%uXXXX, %25XX, %C0%XX,
+/*!...*/, #rand%0A, symbolic logical operators, keyword rewrites, etc.)
+into canonical SQL, so logs can be matched against plain SQL signatures.
+All encoding families are decoded in a single (combined regular expression)
+pass over each line, followed by SQL level rewrites on the decoded line.
+Files are processed as a stream of line chunks spread over worker processes
+"""
+
+import itertools
+import multiprocessing
+import optparse
+import re
+import sys
+
+from mytemper import NONRECURSIVE_KEYWORDS
+from mytemper import _timer
+from mytemper import kb
+
+# Characters which %C0%XX (overlongutf8) could originate from, the most likely first
+OVERLONG_CANDIDATES = " '=(),*-#/<>.;\"!$&+:?@[]^`{|}~%\\"
+
+# Overlong (%C0%XX) byte value -> original character
+OVERLONG_INVERSE = dict(reversed([(0x8A | ord(_), _) for _ in OVERLONG_CANDIDATES]))
+
+# Single pass decoding of all encoding families (longest/most specific first)
+DECODE_REGEX = re.compile(r"(?i)(?P<apostrophe>%EF%BC%87|%00%27|%BF%27)|%u(?P<unicode>[0-9a-f]{4})|%25(?P<double>[0-9a-f]{2})|%C0%(?P<overlong>[0-9a-f]{2})|(?P<comment>(?:%23|#)[a-z]{6,12}(?:%0A|\n)|--(?:[a-z]{6,12})?(?:%0A|\n))|(?P<and>%26%26|&&)|(?P<or>%7C%7C|\|\|)|%(?P<hex>[0-9a-f]{2})|(?P<percent>%)(?![0-9a-f]{2})|(?P<plus>\+)")
+
+# Removal of inline comments (versioned /*!NNNNN...*/ ones keep their content)
+COMMENT_REGEX = re.compile(r"/\*\*/|/\*!\d*|\*/")
+
+NONRECURSIVE_REGEX = re.compile(r"(?i)\b(?:%s)\b" % "|".join("%s%s%s" % (_[:i], _, _[i:]) for _ in NONRECURSIVE_KEYWORDS for i in range(1, len(_))))
+
+# SQL level rewrites reversing keyword/operator tampers (trigger literal, pattern, replacement)
+REWRITES = (
+    ("CONCAT_WS", re.compile(r"(?i)CONCAT_WS\(MID\(CHAR\(0\),0,0\),"), "CONCAT("),
+    ("ISNULL", re.compile(r"(?i)\bIF\(ISNULL\(([^(),]+)\),([^(),]+),\1\)"), r"IFNULL(\1,\2)"),
+    ("GREATEST", re.compile(r"(?i)\bGREATEST\(([^(),]+),([^(),]+)[+ ]1\)=\1"), r"\1>\2"),
+    ("BETWEEN", re.compile(r"(?i)\s+NOT BETWEEN 0 AND\s+"), ">"),
+    ("BETWEEN", re.compile(r"(?i)([\w'\"]+)\s+BETWEEN\s+([\w'\"]+)\s+AND\s+\2\b"), r"\1=\2"),
+    ("LIKE", re.compile(r"(?i)\s+LIKE\s+"), "="),
+    ("0HAVING", re.compile(r" and '0having'='0having'$"), ""),
+    ("SP_PASSWORD", re.compile(r"(?:--\s*)?sp_password$"), ""),
+    (None, re.compile(r"\s*([=<>,()])\s*"), r"\1"),
+    ("UNION ALL", re.compile(r"(?i)\bUNION ALL\b"), "UNION"),
+    (None, re.compile(r"\s+(#|--|\.)"), r"\1"),
+    ("--", re.compile(r"--\s*$"), ""),
+)
+
+BLANKS_REGEX = re.compile(r"[\x00-\x20]+")
+
+WORD_REGEX = re.compile(r"[A-Za-z_]+")
+
+LEADING_WORD_REGEX = re.compile(r"[A-Za-z_]*")
+
+def _decode(match):
+    group = match.lastgroup
+    value = match.group(group)
+
+    if group == "apostrophe":
+        return "'"
+    elif group in ("unicode", "double", "hex"):
+        return chr(int(value, 16)) if int(value, 16) < 0x80 else match.group(0)
+    elif group == "overlong":
+        return OVERLONG_INVERSE.get(int(value, 16), match.group(0))
+    elif group in ("comment", "plus"):
+        return " "
+    elif group == "and":
+        return " AND "
+    elif group == "or":
+        return " OR "
+    else:
+        return ""
+
+def _comments(value):
+    """
+    Returns value with inline comments removed in a single pass, where
+    empty comment inside of a keyword (randomcomments) is dropped and
+    otherwise it is a space
+
+    >>> _comments('I/**/N/**/SERT/**/1/*!UNION*/')
+    'INSERT 1 UNION '
+    """
+
+    retVal = []
+    run, pending, position = [], [], 0
+
+    def _close():
+        # all empty comments inside of a run (of letters and empty comments) share the same fate
+        if pending:
+            keyword = "".join(run).upper() in kb.keywords
+            lengths = [0]
+
+            for _ in run:
+                lengths.append(lengths[-1] + len(_))
+
+            for index, count in pending:
+                retVal[index] = "" if keyword and 0 < lengths[count] < lengths[-1] else " "
+
+        del run[:], pending[:]
+
+    def _gap(gap):
+        match = LEADING_WORD_REGEX.match(gap)
+
+        if match.end() == len(gap):
+            run.append(gap)
+        else:
+            run.append(match.group())
+            _close()
+            run.append(LEADING_WORD_REGEX.match(gap[::-1]).group()[::-1])
+
+        retVal.append(gap)
+
+    for match in COMMENT_REGEX.finditer(value):
+        _gap(value[position:match.start()])
+        position = match.end()
+
+        if match.group(0) == "/**/":
+            pending.append((len(retVal), len(run)))
+            retVal.append(None)
+        else:
+            _close()
+            retVal.append(" ")
+
+    _gap(value[position:])
+    _close()
+
+    return "".join(retVal)
+
+def detamper(value):
+    """
+    Returns canonical (detampered) form of a given value
+
+    >>> detamper('1%23nVNaVoPYeva%0AAND%23ngNvzqu%0A9227=9227')
+    '1 AND 9227=9227'
+    >>> detamper('1/*!UNION*//*!ALL*//*!SELECT*//*!NULL*/,/*!NULL*/#')
+    '1 UNION SELECT NULL,NULL#'
+    >>> detamper('%2553%2545%254C%2545%2543%2554%2520%2546%2549%2545%254C%2544')
+    'SELECT FIELD'
+    >>> detamper('1 %26%26 I/**/N/**/SERT')
+    '1 AND INSERT'
+    """
+
+    retVal = DECODE_REGEX.sub(_decode, value)
+
+    if "/*" in retVal:
+        retVal = _comments(retVal)
+
+    retVal = NONRECURSIVE_REGEX.sub(lambda match: next(_ for _ in NONRECURSIVE_KEYWORDS if len(match.group()) == 2 * len(_) and _ in match.group().upper()).upper(), retVal)
+
+    retVal = BLANKS_REGEX.sub(" ", retVal)
+    upper = retVal.upper()
+
+    for trigger, regex, replacement in REWRITES:
+        if trigger is None or trigger in upper:
+            retVal = regex.sub(replacement, retVal)
+
+    if not retVal.isupper():
+        retVal = WORD_REGEX.sub(lambda match: match.group().upper() if match.group().upper() in kb.keywords else match.group(), retVal)
+
+    return retVal.strip()
+
+def _detamperlines(lines):
+    return sum(len(_) for _ in lines), [detamper(_.rstrip("\r\n")) for _ in lines]
+
+def normalize(infile, outfile, workers=None, chunksize=10000):
+    """
+    Writes detampered lines of infile to outfile (processing chunks of lines
+    in parallel), returning number of processed lines and input bytes
+    """
+
+    chunks = iter(lambda: list(itertools.islice(infile, chunksize)), [])
+    lines = size = 0
+
+    if workers == 1:
+        results = (_detamperlines(_) for _ in chunks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(_detamperlines, chunks)
+
+    try:
+        for length, chunk in results:
+            for line in chunk:
+                outfile.write("%s\n" % line)
+
+            lines += len(chunk)
+            size += length
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return lines, size
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [input [output]]")
+    parser.add_option("--workers", type="int", help="Number of worker processes (default: number of CPUs)")
+    parser.add_option("--chunk-size", dest="chunksize", type="int", default=10000, help="Number of lines per chunk (default 10000)")
+    options, args = parser.parse_args()
+
+    with (open(args[0]) if args else sys.stdin) as infile, (open(args[1], "w") if len(args) > 1 else sys.stdout) as outfile:
+        start = _timer()
+        lines, size = normalize(infile, outfile, options.workers, options.chunksize)
+        elapsed = _timer() - start
+
+    sys.stderr.write("%d lines (%.1f MB) processed in %.2f sec (%.1f MB/min)\n" % (lines, size / 1e6, elapsed, 60 * size / 1e6 / max(elapsed, 1e-6)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""
+Golden (regression and benchmark) corpus extracted from tamper doctests
+
+Each >>> tamper(...) example found in docstrings of mytemper tampers
+becomes a (tamper, input, seed, expected) record, where seed comes from
+an immediately preceding random.seed(...) example. Expected outputs of
+doctest records are the documented ones, while doctests the current
+implementation disagrees with get reported at extraction time. Corpus is
+synthetically grown with larger variants of each example (input repeated
+multiple times), with expected outputs recorded by running the current
+implementation (re-seeded per record), so that optimized tampers can be
+validated (and benchmarked) against it. Records whose output depends on
+the RNG state without a seed are marked as skipped
+"""
+
+import ast
+import doctest
+import json
+import optparse
+import random
+import re
+import time
+
+import mytemper
+
+# Number of input repetitions used for synthetic variants
+DEFAULT_SIZES = (4, 16, 64)
+
+def _call(source):
+    """
+    Returns (payload, kwargs) if a given example source is a plain call of
+    tamper with literal arguments (None otherwise)
+    """
+
+    try:
+        node = ast.parse(source.strip()).body[0].value
+    except (SyntaxError, IndexError, AttributeError):
+        return None
+
+    if not isinstance(node, ast.Call) or getattr(node.func, "id", None) != "tamper" or len(node.args) != 1:
+        return None
+
+    try:
+        payload = ast.literal_eval(node.args[0])
+        kwargs = dict((_.arg, ast.literal_eval(_.value)) for _ in node.keywords)
+    except ValueError:
+        return None
+
+    return (payload, kwargs) if not isinstance(payload, bytes) or isinstance(payload, str) else None
+
+def _run(name, payload, seed, kwargs=None):
+    if seed is not None:
+        random.seed(seed)
+
+    retVal = getattr(mytemper, name)(payload, **(kwargs or {}))
+
+    if isinstance(retVal, bytes) and not isinstance(retVal, str):
+        retVal = retVal.decode("latin1")
+
+    return retVal
+
+def _want(example):
+    """
+    Returns output documented by a given doctest example (None if it is not
+    a literal)
+    """
+
+    try:
+        retVal = ast.literal_eval(example.want.strip())
+    except (SyntaxError, ValueError):
+        return None
+
+    if isinstance(retVal, bytes) and not isinstance(retVal, str):
+        retVal = retVal.decode("latin1")
+
+    return retVal
+
+def _record(name, payload, seed, kwargs, source, expected=None):
+    retVal = dict(tamper=name, input=payload, kwargs=kwargs, seed=seed, expected=_run(name, payload, seed, kwargs) if expected is None else expected, source=source, skip=False)
+
+    if seed is None:
+        random.seed(0)
+        _ = _run(name, payload, None, kwargs)
+        random.seed(1)
+        retVal["skip"] = _ != _run(name, payload, None, kwargs)
+
+    return retVal
+
+def extract(sizes=DEFAULT_SIZES, mismatches=None):
+    """
+    Returns list of golden records (dictionaries) extracted from tamper
+    doctests and grown with synthetic variants of given sizes (doctest
+    records the current implementation disagrees with, including the ones
+    with non-literal documented output, get appended to a given list of
+    mismatches as (record, documented output, actual output))
+    """
+
+    retVal = []
+
+    for name in sorted(mytemper.TAMPER_PROPERTIES):
+        seed = None
+
+        for example in doctest.DocTestParser().get_examples(getattr(mytemper, name).__doc__ or ""):
+            match = re.match(r"\s*random\.seed\((\d+)\)", example.source)
+
+            if match:
+                seed = int(match.group(1))
+                continue
+
+            call = _call(example.source)
+
+            if not call:
+                seed = None
+                continue
+
+            payload, kwargs = call
+
+            want = _want(example)
+            record = _record(name, payload, seed, kwargs, "doctest", want)
+            retVal.append(record)
+
+            if mismatches is not None and not record["skip"]:
+                actual = _run(name, payload, seed, kwargs)
+
+                if want is None or actual != want:
+                    mismatches.append((record, example.want.strip() if want is None else want, actual))
+
+            for size in sizes:
+                retVal.append(_record(name, " ".join([payload] * size), seed, kwargs, "synthetic"))
+
+            # NOTE: seed affects only the example directly following it
+            seed = None
+
+    return retVal
+
+def check(corpus):
+    """
+    Returns list of (record, actual output) for records not matching the
+    current implementation (skipped records are ignored)
+    """
+
+    retVal = []
+
+    for record in corpus:
+        if record.get("skip"):
+            continue
+
+        actual = _run(record["tamper"], record["input"], record["seed"], record["kwargs"])
+
+        if actual != record["expected"]:
+            retVal.append((record, actual))
+
+    return retVal
+
+def benchmark(corpus, duration=0.05):
+    """
+    Returns (tamper, input length, microseconds per call) for each record
+    """
+
+    retVal = []
+
+    for record in corpus:
+        function, payload, kwargs = getattr(mytemper, record["tamper"]), record["input"], record["kwargs"]
+        count, start = 0, time.time()
+
+        while time.time() - start < duration:
+            function(payload, **kwargs)
+            count += 1
+
+        retVal.append((record["tamper"], len(payload), 1e6 * (time.time() - start) / count))
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] (extract|check|benchmark) corpus.json")
+    parser.add_option("--sizes", default=",".join(str(_) for _ in DEFAULT_SIZES), help="Repetitions used for synthetic variants (default %s)" % ",".join(str(_) for _ in DEFAULT_SIZES))
+    options, args = parser.parse_args()
+
+    if len(args) != 2 or args[0] not in ("extract", "check", "benchmark"):
+        parser.error("missing (or wrong) command and/or corpus file")
+
+    command, filename = args
+
+    if command == "extract":
+        mismatches = []
+        corpus = extract(tuple(int(_) for _ in options.sizes.split(',')), mismatches)
+
+        for record, documented, actual in mismatches:
+            print("[doctest mismatch] %s(%r, seed=%s): documented %r, got %r" % (record["tamper"], record["input"][:40], record["seed"], documented[:60], actual[:60]))
+
+        with open(filename, "w") as f:
+            json.dump(corpus, f, indent=1, sort_keys=True)
+
+        print("%d records written to '%s' (%d doctest mismatches)" % (len(corpus), filename, len(mismatches)))
+    else:
+        with open(filename) as f:
+            corpus = json.load(f)
+
+        if command == "check":
+            failures = check(corpus)
+
+            for record, actual in failures:
+                print("[%s] %s(%r, seed=%s): expected %r, got %r" % (record["source"], record["tamper"], record["input"][:40], record["seed"], record["expected"][:60], actual[:60]))
+
+            skipped = sum(1 for _ in corpus if _.get("skip"))
+
+            print("%d/%d records passed (%d skipped)" % (len(corpus) - skipped - len(failures), len(corpus) - skipped, skipped))
+        else:
+            print("%-28s %10s %14s" % ("tamper", "length", "usec/call"))
+
+            for name, length, elapsed in benchmark(corpus):
+                print("%-28s %10d %14.1f" % (name, length, elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+"""
+Prefix/suffix-aware incremental re-tampering
+
+Payloads are built as prefix + core + suffix, where (during a scan) only
+the core changes between probes. Stages of a chain known to be local
+(tamper(a + b) == tamper(a) + tamper(b) with a split at a neutral point,
+optionally with a small state carried over the split, e.g. being inside
+of quotes) are run on the three parts separately, with results of prefix
+and suffix parts cached (by part and the state at its start). Split
+points not being neutral for a stage (e.g. inside of a %XX sequence or
+of a keyword) are moved into the prefix/suffix by up to a few characters,
+making the core a bit longer. The first stage that is not local (or not
+deterministic) merges the parts and the rest of the chain runs as usual
+"""
+
+import collections
+import optparse
+import re
+import time
+
+from mytemper import _gettamper
+from mytemper import _isbytes
+from mytemper import tamperchain
+from mytemper import tamperproperties
+
+# Default maximum number of cached (tampered) parts
+DEFAULT_PART_CACHE_SIZE = 4096
+
+# Maximum number of characters a split point gets moved by in search of a neutral one
+SPLIT_WINDOW = 32
+
+# Initial state of space replacing tampers (first space found, inside of quotes, inside of double quotes)
+SPACE_STATE = (False, False, False)
+
+# Regular expression used for recognition of word characters (around keyword tampers' split points)
+WORD_REGEX = re.compile(r"\w")
+
+def _outsideescape(left, right):
+    """
+    Split point is neutral for (chunk-safe) encoders if it's not inside
+    of a %XX sequence
+    """
+
+    return '%' not in left[-2:]
+
+def _outsidekeyword(left, right):
+    """
+    Split point is neutral for versioned keyword tampers if it's not next
+    to a word character (lookbehind/lookahead of keyword matching) and it
+    doesn't split their final ' /*!' and '*/ ' replacements
+    """
+
+    if not left or not right:
+        return True
+
+    return not (WORD_REGEX.match(left[-1]) or WORD_REGEX.match(right[0]) or left[-1] in " /*!" and right[0] in " /*!")
+
+def _spacestate(text, state):
+    firstspace, quote, doublequote = state
+
+    for char in text:
+        if not firstspace:
+            if char.isspace():
+                firstspace = True
+
+        elif char == '\'':
+            quote = not quote
+
+        elif char == '"':
+            doublequote = not doublequote
+
+    return firstspace, quote, doublequote
+
+def _spacesentinel(state):
+    firstspace, quote, doublequote = state
+
+    return (" " + ("'" if quote else "") + ('"' if doublequote else "")) if firstspace else ""
+
+def _dashstate(text, state):
+    return state or '#' in text or "-- " in text
+
+# Local stages: (is split point neutral, initial state, state after a given text, text putting tamper into a given state)
+LOCAL_TAMPERS = {
+    "apostrophemask": (_outsideescape, None, None, None),
+    "apostrophenullencode": (_outsideescape, None, None, None),
+    "chardoubleencode": (_outsideescape, None, None, None),
+    "charencode": (_outsideescape, None, None, None),
+    "charunicodeencode": (_outsideescape, None, None, None),
+    "overlongutf8": (_outsideescape, None, None, None),
+    "percentage": (_outsideescape, None, None, None),
+    "space2comment": (lambda left, right: True, SPACE_STATE, _spacestate, _spacesentinel),
+    "space2plus": (lambda left, right: True, SPACE_STATE, _spacestate, _spacesentinel),
+    "space2mysqldash": (lambda left, right: '-' not in left[-2:], False, _dashstate, lambda state: '#'),
+    "versionedkeywords": (_outsidekeyword, None, None, None),
+    "versionedmorekeywords": (_outsidekeyword, None, None, None),
+    "halfversionedmorekeywords": (_outsidekeyword, None, None, None),
+}
+
+class IncrementalChain(object):
+    """
+    Runs a chain of tampers over payloads built as prefix + core + suffix,
+    reusing tampered prefix and suffix parts for stages that are local
+
+    >>> chain = IncrementalChain(('space2comment', 'charencode'))
+    >>> chain.tamper("1' ", "AND 1=1", " AND 'a b'='a b") == tamperchain("1' AND 1=1 AND 'a b'='a b", ('space2comment', 'charencode'))
+    True
+    >>> _ = chain.tamper("1' ", "AND 2=2", " AND 'a b'='a b")
+    >>> chain.hits
+    4
+    """
+
+    def __init__(self, tampers, maxsize=DEFAULT_PART_CACHE_SIZE):
+        self.tampers = tuple(_gettamper(_) for _ in tampers)
+        self.maxsize = maxsize
+        self.cache = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def _part(self, function, text, state, cached=True, **kwargs):
+        """
+        Returns (tampered part, state after it) for a given stage and part
+        starting in a given state
+        """
+
+        key = (function, text, state)
+
+        if cached and key in self.cache:
+            self.hits += 1
+            retVal = self.cache.pop(key)
+            self.cache[key] = retVal
+            return retVal
+
+        _, initial, scanner, sentinel = LOCAL_TAMPERS[function.__name__]
+        prefix = sentinel(state) if state != initial else ""
+
+        if not text:
+            retVal = text
+        elif prefix:
+            retVal = function(prefix + text, **kwargs)[len(function(prefix, **kwargs)):]
+        else:
+            retVal = function(text, **kwargs)
+
+        retVal = (retVal, scanner(text, state) if scanner else None)
+
+        if cached:
+            self.misses += 1
+            self.cache[key] = retVal
+
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+        return retVal
+
+    def _split(self, neutral, prefix, core, suffix):
+        """
+        Moves split points (into prefix and suffix) until neutral
+        """
+
+        for i in range(len(prefix), max(-1, len(prefix) - SPLIT_WINDOW - 1), -1):
+            if not i or neutral(prefix[max(0, i - 2):i], (prefix[i:i + 2] + core[:2] + suffix[:2])[:2]):
+                break
+        else:
+            i = 0
+
+        prefix, core = prefix[:i], prefix[i:] + core
+
+        for j in range(0, min(len(suffix), SPLIT_WINDOW) + 1):
+            if j == len(suffix) or neutral((prefix[-2:] + core[-2:] + suffix[:j])[-2:], suffix[j:j + 2]):
+                break
+        else:
+            j = len(suffix)
+
+        return prefix, core + suffix[:j], suffix[j:]
+
+    def tamper(self, prefix, core, suffix, **kwargs):
+        """
+        Returns prefix + core + suffix run through the chain of tampers
+        """
+
+        if any(_isbytes(_) for _ in (prefix, core, suffix)):
+            return tamperchain(prefix + core + suffix, self.tampers, **kwargs)
+
+        for i in range(len(self.tampers)):
+            function = self.tampers[i]
+            properties = tamperproperties(function)
+
+            if properties["headers"]:
+                function(core, **kwargs)
+                continue
+
+            if function.__name__ not in LOCAL_TAMPERS or not properties["deterministic"]:
+                return tamperchain(prefix + core + suffix, self.tampers[i:], **kwargs)
+
+            neutral, state = LOCAL_TAMPERS[function.__name__][:2]
+            prefix, core, suffix = self._split(neutral, prefix, core, suffix)
+            prefix, state = self._part(function, prefix, state, **kwargs)
+            core, state = self._part(function, core, state, cached=False, **kwargs)
+            suffix, _ = self._part(function, suffix, state, **kwargs)
+
+        return prefix + core + suffix
+
+def benchmark(tampers, prefix, cores, suffix):
+    """
+    Returns seconds per probe of tamperchain() and of the incremental chain
+    (checking that both produce the same output)
+    """
+
+    chain = IncrementalChain(tampers)
+    retVal = []
+
+    for incremental in (False, True):
+        start = time.time()
+
+        for core in cores:
+            result = chain.tamper(prefix, core, suffix) if incremental else tamperchain(prefix + core + suffix, tampers)
+
+        retVal.append((time.time() - start) / len(cores))
+
+    if result != tamperchain(prefix + cores[-1] + suffix, tampers):
+        raise AssertionError("incremental chain output differs")
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--tamper", default="space2comment,charencode", help="Comma separated chain of tampers (default space2comment,charencode)")
+    parser.add_option("--prefix", default="1' AND 'x y'='x y' AND ", help="Payload prefix")
+    parser.add_option("--suffix", default=" AND 'a b'='a b' UNION ALL SELECT NULL,NULL,NULL-- -", help="Payload suffix")
+    parser.add_option("--repeat", type="int", default=20, help="Number of times prefix and suffix get repeated (default 20)")
+    parser.add_option("--count", type="int", default=1000, help="Number of probes (default 1000)")
+    options, _ = parser.parse_args()
+
+    prefix, suffix = options.prefix * options.repeat, options.suffix * options.repeat
+    cores = ["ORD(MID((SELECT IFNULL(CAST(username AS CHAR),0x20) FROM users),%d,1))>%d" % (_ % 32 + 1, _ % 128) for _ in range(options.count)]
+    full, incremental = benchmark(options.tamper.split(','), prefix, cores, suffix)
+    stable = 1.0 - 1.0 * len(cores[-1]) / (len(prefix) + len(cores[-1]) + len(suffix))
+
+    print("%-14s %12s" % ("method", "usec/probe"))
+    print("%-14s %12.1f" % ("tamperchain", 1e6 * full))
+    print("%-14s %12.1f" % ("incremental", 1e6 * incremental))
+    print("stable fraction: %.1f%%, speedup: %.2fx" % (100 * stable, full / incremental))
+
+if __name__ == "__main__":
+    main()
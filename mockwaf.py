@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""
+Local mock web application firewall for (end-to-end) benchmarking of
+tamper chains
+
+Rule sets are modeled after ModSecurity Core Rule Set (CRS) style regular
+expressions, applied after (configurable number of) url-decoding passes.
+Driver pushes tampered payloads through a locally started server and
+reports requests per second, tamper CPU share, bytes on the wire and pass
+rate per chain
+"""
+
+import optparse
+import re
+import threading
+import time
+
+try:
+    import http.client as httplib
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import quote
+except ImportError:
+    import httplib
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import quote
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+from mytemper import tamperchain
+
+# Rule sets (rule id, regular expression) modeled after CRS SQL injection rules
+WAF_RULESETS = {
+    "weak": (
+        (942100, r"(?i)\bunion\s+(all\s+)?select\b"),
+        (942150, r"(?i)\bsleep\s*\("),
+        (942140, r"(?i)\binformation_schema\."),
+    ),
+    "crs": (
+        (942100, r"(?i)\bunion\b[\s\S]*?\bselect\b"),
+        (942110, r"(?i)'\s*(and|or|xor)\b"),
+        (942120, r"(?i)\b(and|or)\b\s+[\w'\"]+\s*(=|<|>|like\b)"),
+        (942130, r"(?i)\b(\d+)\s*=\s*\1\b"),
+        (942140, r"(?i)\binformation_schema\b"),
+        (942150, r"(?i)\b(sleep|benchmark|concat|ifnull|char|cast)\s*\("),
+        (942160, r"(?i)\bselect\b[\s\S]+?\bfrom\b"),
+        (942170, r"/\*!?\d*|--[\s\S]*$|#"),
+        (942180, r"(?i)\bcurrent_user\b"),
+        (942190, r"&&|\|\||%00|\x00"),
+    ),
+}
+
+# Characters url-encoded by the driver (everything else is sent as it is)
+SAFE_URL_CHARS = "%'\"()*,-./:;<=>!@$^_`{|}~[]\\?"
+
+# Default payload corpus (as found in tamper examples)
+DEFAULT_PAYLOADS = (
+    "1 AND 1=1",
+    "1 AND '1'='1",
+    "1' AND SLEEP(5)#",
+    "1 AND A > B--",
+    "1 AND 9227=9227",
+    "SELECT id FROM users WHERE id = 1",
+    "SELECT table_name FROM INFORMATION_SCHEMA.TABLES",
+    "1 UNION ALL SELECT NULL, NULL, CONCAT(CHAR(58,104,116,116,58),IFNULL(CAST(CURRENT_USER() AS CHAR),CHAR(32)),CHAR(58,100,114,117,58))#",
+    "value' UNION ALL SELECT CONCAT(CHAR(58,107,112,113,58),IFNULL(CAST(CURRENT_USER() AS CHAR),CHAR(32)),CHAR(58,97,110,121,58)), NULL, NULL# AND 'QDWa'='QDWa",
+)
+
+URLDECODE_REGEX = re.compile(r"%u([0-9a-fA-F]{4})|%([0-9a-fA-F]{2})")
+
+def urldecode(value):
+    """
+    Url-decodes a given value (including %uXXXX sequences, like CRS t:urlDecodeUni)
+
+    >>> urldecode('%u0053%45L%2545')
+    'SEL%45'
+    """
+
+    return URLDECODE_REGEX.sub(lambda match: unichr(int(match.group(1) or match.group(2), 16)), value)
+
+class MockWaf(object):
+    """
+    Offline (in-process) WAF oracle
+
+    >>> waf = MockWaf()
+    >>> waf.blocks('1 AND 1=1')
+    942120
+    >>> waf.blocks('1')
+    """
+
+    def __init__(self, ruleset="crs", decode=1, trusted=None):
+        self.rules = tuple((_, re.compile(__)) for _, __ in (WAF_RULESETS[ruleset] if isinstance(ruleset, str) else ruleset))
+        self.decode = decode
+        self.trusted = trusted or {}
+
+    def blocks(self, value, headers=None):
+        """
+        Returns id of the first rule matching a given value (None if passing)
+        """
+
+        if headers and any(headers.get(_) == __ for _, __ in self.trusted.items()):
+            return None
+
+        for _ in range(self.decode):
+            value = urldecode(value)
+
+        for rule, regex in self.rules:
+            if regex.search(value):
+                return rule
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        value = self.path.partition("?q=")[2]
+        code = 403 if self.server.waf.blocks(value, dict(self.headers.items())) else 200
+
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def startserver(waf, host="127.0.0.1", port=0):
+    """
+    Starts mock WAF server in a background thread (returns server instance)
+    """
+
+    server = _ThreadingServer((host, port), _RequestHandler)
+    server.waf = waf
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server
+
+def drive(chain, payloads, address, repeat=1):
+    """
+    Pushes payloads tampered with a given chain through mock WAF server,
+    returning dictionary with collected results
+    """
+
+    connection = httplib.HTTPConnection(*address)
+    retVal = dict(chain=chain, requests=0, passed=0, bytes=0, elapsed=0.0, tampering=0.0)
+    start = time.time()
+
+    for _ in range(repeat):
+        for payload in payloads:
+            headers = {}
+            _ = time.time()
+            value = tamperchain(payload, chain, headers=headers)
+            retVal["tampering"] += time.time() - _
+
+            if isinstance(value, bytes) and not isinstance(value, str):
+                value = value.decode("latin1")
+
+            request = "/?q=%s" % quote(value, safe=SAFE_URL_CHARS)
+            connection.request("GET", request, headers=headers)
+            response = connection.getresponse()
+            response.read()
+
+            retVal["requests"] += 1
+            retVal["passed"] += response.status == 200
+            retVal["bytes"] += len(request) + sum(len(_) + len(__) + 4 for _, __ in headers.items())
+
+    retVal["elapsed"] = time.time() - start
+    connection.close()
+
+    return retVal
+
+def report(results):
+    """
+    Returns textual report of collected results
+    """
+
+    retVal = "%-48s %9s %9s %11s %9s" % ("chain", "req/sec", "tamper %", "bytes/req", "pass %")
+
+    for _ in results:
+        retVal += "\n%-48s %9.1f %9.1f %11.1f %9.1f" % (",".join(_["chain"]) or "-", _["requests"] / _["elapsed"], 100.0 * _["tampering"] / _["elapsed"], 1.0 * _["bytes"] / _["requests"], 100.0 * _["passed"] / _["requests"])
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] chain [chain ...]  (e.g. space2comment,charencode)")
+    parser.add_option("--ruleset", default="crs", choices=sorted(WAF_RULESETS), help="Rule set to use (%s)" % ", ".join(sorted(WAF_RULESETS)))
+    parser.add_option("--decode", type="int", default=1, help="Number of url-decoding passes done by WAF (default 1)")
+    parser.add_option("--payloads", help="File with payloads (one per line)")
+    parser.add_option("--repeat", type="int", default=10, help="Number of passes over payloads (default 10)")
+    options, args = parser.parse_args()
+
+    if options.payloads:
+        with open(options.payloads) as f:
+            payloads = [_.rstrip("\r\n") for _ in f if _.strip()]
+    else:
+        payloads = DEFAULT_PAYLOADS
+
+    server = startserver(MockWaf(options.ruleset, options.decode))
+    results = [drive(tuple(_ for _ in chain.split(',') if _), payloads, server.server_address, options.repeat) for chain in (args or [""])]
+    server.shutdown()
+
+    print(report(results))
+
+if __name__ == "__main__":
+    main()
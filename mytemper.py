@@ -1,4 +1,247 @@
+import random
 import re
+import string
+import time
+
+from random import sample
+
+try:
+    from lib.core.common import randomInt
+    from lib.core.common import randomRange
+    from lib.core.common import singleTimeWarnMessage
+    from lib.core.compat import xrange
+    from lib.core.data import kb
+    from lib.core.settings import IGNORE_SPACE_AFFECTED_KEYWORDS
+    from lib.core.settings import UNICODE_ENCODING
+except ImportError:  # running outside of sqlmap
+    from tampershim import IGNORE_SPACE_AFFECTED_KEYWORDS
+    from tampershim import UNICODE_ENCODING
+    from tampershim import kb
+    from tampershim import randomInt
+    from tampershim import randomRange
+    from tampershim import singleTimeWarnMessage
+    from tampershim import xrange
+
+# Regular expression used for recognition of already encoded (%XX) bytes
+ENCODED_BYTES_REGEX = re.compile(b"%[0-9a-fA-F]{2}")
+
+# Translation tables for high and low hex digit of each byte value
+HEX_HIGH_TABLE = bytes(bytearray(bytearray(b"0123456789ABCDEF")[_ >> 4] for _ in range(256)))
+HEX_LOW_TABLE = bytes(bytearray(bytearray(b"0123456789ABCDEF")[_ & 0xf] for _ in range(256)))
+
+# Per-byte output of overlongutf8 (alphanumerics are left as they are)
+OVERLONG_BYTES_TABLE = tuple(bytes(bytearray((_,))) if chr(_) in string.ascii_letters + string.digits else ("%%C0%%%.2X" % (0x8A | _)).encode() for _ in range(256))
+
+# Per-byte output of percentage (spaces are left as they are)
+PERCENTAGE_BYTES_TABLE = tuple(bytes(bytearray((_,))) if _ == ord(' ') else b"%" + bytes(bytearray((_,))) for _ in range(256))
+
+# Translation table from standard to URL-safe base64 alphabet ('+' and '/' to '-' and '_')
+URLSAFE_BASE64_TABLE = bytes(bytearray(ord('-') if _ == ord('+') else ord('_') if _ == ord('/') else _ for _ in range(256)))
+
+def _isbytes(payload):
+    """
+    Checks if a given payload is a bytes-like value (bytes or bytearray)
+    """
+
+    return isinstance(payload, (bytes, bytearray))
+
+def _singlebytes(payload):
+    """
+    Returns a given (text) payload as bytes with one byte per character
+    (None if some character doesn't fit into a single byte)
+
+    >>> _singlebytes(u'1 AND 1=1') == b'1 AND 1=1'
+    True
+    """
+
+    try:
+        return payload.encode("latin1")
+    except UnicodeError:
+        return None
+
+def _hexencodebytes(payload, prefix, escape):
+    """
+    Encodes each byte of a given bytes payload as prefix followed by two
+    hex digits, while already encoded (%XX) ones get escape instead of '%'
+
+    >>> _hexencodebytes(b"SELECT%20A", b"%25", b"%25") == b"%2553%2545%254C%2545%2543%2554%2520%2541"
+    True
+    """
+
+    payload = bytes(payload)
+    matches = list(ENCODED_BYTES_REGEX.finditer(payload))
+    width = len(prefix) + 2
+    retVal = bytearray(width * (len(payload) - 3 * len(matches)) + (len(escape) + 2) * len(matches))
+    index = position = 0
+
+    for match in matches + [None]:
+        segment = payload[index:match.start() if match else len(payload)]
+
+        if segment:
+            end = position + width * len(segment)
+
+            for i in xrange(len(prefix)):
+                retVal[position + i:end:width] = prefix[i:i + 1] * len(segment)
+
+            retVal[position + width - 2:end:width] = segment.translate(HEX_HIGH_TABLE)
+            retVal[position + width - 1:end:width] = segment.translate(HEX_LOW_TABLE)
+            position = end
+
+        if match:
+            _ = escape + payload[match.start() + 1:match.end()]
+            retVal[position:position + len(_)] = _
+            position += len(_)
+            index = match.end()
+
+    return bytes(retVal)
+
+def _mapbytes(payload, table):
+    """
+    Maps each byte of a given bytes payload through a lookup table, while
+    already encoded (%XX) ones are left as they are
+
+    >>> _mapbytes(b"A B%20", PERCENTAGE_BYTES_TABLE) == b"%A %B%20"
+    True
+    """
+
+    payload = bytes(payload)
+    retVal = []
+    index = 0
+
+    for match in ENCODED_BYTES_REGEX.finditer(payload):
+        retVal.extend(table[_] for _ in bytearray(payload[index:match.start()]))
+        retVal.append(match.group())
+        index = match.end()
+
+    retVal.extend(table[_] for _ in bytearray(payload[index:]))
+
+    return b"".join(retVal)
+
+# Regular expressions used for recognition of (non-function) keywords by keyword tampers
+KEYWORD_REGEX = re.compile(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=\W|\Z)")
+NONFUNCTION_KEYWORD_REGEX = re.compile(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=[^\w(]|\Z)")
+UPPERCASE_KEYWORD_REGEX = re.compile(r"\b(?P<word>[A-Z_]+)(?=[^\w(]|\Z)")
+
+# Maximum number of word spellings kept in a keyword rewrite table
+REWRITE_TABLE_SIZE = 4096
+
+# Templates (and ignored keywords) of keyword rewrite tables used by keyword tampers
+REWRITE_TEMPLATES = {
+    "bluecoat": (("%s%%09", ()),),
+    "halfversionedmorekeywords": (("/*!0%s", IGNORE_SPACE_AFFECTED_KEYWORDS),),
+    "space2morehash": (("%s%%23", IGNORE_SPACE_AFFECTED_KEYWORDS),),
+    "versionedkeywords": (("/*!%s*/", ()),),
+    "versionedmorekeywords": (("/*!%s*/", IGNORE_SPACE_AFFECTED_KEYWORDS),),
+}
+
+# Keyword rewrite tables shared by tampers ((template, ignored keywords, id of keyword set) -> table)
+_rewritetables = {}
+
+class _RewriteTable(dict):
+    """
+    Rewrites (by a given template) of words as spelled in payloads (so the
+    original case is preserved), with None for words not being keywords.
+    Upper and lower case spellings of keywords are precomputed, while the
+    rest gets filled on first use
+    """
+
+    def __init__(self, template, ignore=(), keywords=None):
+        dict.__init__(self)
+        self.template = template
+        self.ignore = ignore
+        self.keywords = kb.keywords if keywords is None else keywords
+
+        for keyword in self.keywords:
+            if keyword == keyword.upper() and keyword not in ignore:
+                self[keyword] = template % keyword
+                self[keyword.lower()] = template % keyword.lower()
+
+    def __missing__(self, word):
+        retVal = self.template % word if word.upper() in self.keywords and word.upper() not in self.ignore else None
+
+        if len(self) < REWRITE_TABLE_SIZE:
+            self[word] = retVal
+
+        return retVal
+
+def _rewritetable(template, ignore=()):
+    """
+    Returns keyword rewrite table for a given template (shared between
+    tampers, built for each keyword set kb.keywords gets replaced with)
+
+    >>> _rewritetable("/*!%s*/")["Union"]
+    '/*!Union*/'
+    """
+
+    key = (template, ignore, id(kb.keywords))
+    table = _rewritetables.get(key)
+
+    if table is None or table.keywords is not kb.keywords:
+        # tables of keyword sets replaced long ago get dropped
+        if len(_rewritetables) > 8 * len(REWRITE_TEMPLATES):
+            _rewritetables.clear()
+
+        table = _rewritetables[key] = _RewriteTable(template, ignore)
+
+    return table
+
+def _rewritekeywords(payload, regex, table, before=None, after=None):
+    """
+    Replaces words (group 'word' of a given regex) with their rewrites from
+    a given table in a single pass, dropping the space in front of (rewrite
+    starting with before marker) and behind (ending with after marker) each
+    of them, as replace(" " + before, before) and replace(after + " ", after)
+    would (markers already present in the payload fall back to the latter)
+
+    >>> _rewritekeywords("1 UNION ALL SELECT 2", KEYWORD_REGEX, _rewritetable("/*!%s*/"), "/*!", "*/")
+    '1/*!UNION*//*!ALL*//*!SELECT*/2'
+    """
+
+    squeeze = not any(_ and _ in payload for _ in (before, after))
+    retVal = []
+    index = 0
+
+    for match in regex.finditer(payload):
+        rewrite = table[match.group("word")]
+
+        if rewrite is None:
+            continue
+
+        start = match.start()
+
+        if squeeze and before and start > index and payload[start - 1] == ' ':
+            start -= 1
+
+        retVal.append(payload[index:start])
+        retVal.append(rewrite)
+        index = match.end()
+
+        if squeeze and after and payload[index:index + 1] == ' ':
+            index += 1
+
+    retVal.append(payload[index:])
+    retVal = "".join(retVal)
+
+    if not squeeze:
+        if before:
+            retVal = retVal.replace(" " + before, before)
+
+        if after:
+            retVal = retVal.replace(after + " ", after)
+
+    return retVal
+
+def prebuildkeywords():
+    """
+    Loads keyword set (kb.keywords) and builds keyword rewrite tables of
+    keyword tampers upfront (e.g. before worker processes get forked, so
+    they share them copy-on-write instead of building their own)
+    """
+
+    for templates in REWRITE_TEMPLATES.values():
+        for template, ignore in templates:
+            _rewritetable(template, ignore)
+
 def apostrophemask(payload, **kwargs):
     """
     Replaces apostrophe character with its UTF-8 full width counterpart
@@ -9,7 +252,12 @@ def apostrophemask(payload, **kwargs):
         * http://lukasz.pilorz.net/testy/full_width_utf/index.phps
     >>> tamper("1 AND '1'='1")
     '1 AND %EF%BC%871%EF%BC%87=%EF%BC%871'
+    >>> tamper(b"1 AND '1'='1") == b'1 AND %EF%BC%871%EF%BC%87=%EF%BC%871'
+    True
     """
+    if _isbytes(payload):
+        return bytes(payload).replace(b"'", b"%EF%BC%87")
+
     return payload.replace('\'', "%EF%BC%87") if payload else payload
 
 
@@ -37,20 +285,64 @@ def appendnullbyte(payload, **kwargs):
     Reference: http://projects.webappsec.org/w/page/13246949/Null-Byte-Injection
     >>> tamper('1 AND 1=1')
     '1 AND 1=1%00'
+    >>> tamper(bytearray(b'1 AND 1=1')) == b'1 AND 1=1%00'
+    True
     """
+    if _isbytes(payload):
+        return bytes(payload) + b"%00" if payload else bytes(payload)
+
     return "%s%%00" % payload if payload else payload
 
 
 
+def _base64(data, urlsafe=False, padding=True):
+    """
+    Returns base64 encoded bytes data (optionally with URL-safe alphabet
+    and/or without padding)
+
+    >>> _base64(b'\\xfb\\xff', urlsafe=True, padding=False) == b'-_8'
+    True
+    """
+
+    import binascii
+
+    retVal = binascii.b2a_base64(data)[:-1]
+
+    if urlsafe:
+        retVal = retVal.translate(URLSAFE_BASE64_TABLE)
+
+    if not padding:
+        retVal = retVal.rstrip(b"=")
+
+    return retVal
+
+def _text(value):
+    """
+    Returns ASCII bytes value as native string
+    """
+
+    return value if isinstance(value, str) else value.decode("ascii")
+
 def base64encode(payload, **kwargs):
     """
-    Base64 all characters in a given payload
+    Base64 all characters in a given payload (str payload results in str,
+    bytes one in bytes; URL-safe alphabet and omitting of padding can be
+    requested with urlsafe and padding keyword arguments)
     >>> tamper("1' AND SLEEP(5)#")
     'MScgQU5EIFNMRUVQKDUpIw=='
+    >>> tamper("1' AND SLEEP(5)#", padding=False)
+    'MScgQU5EIFNMRUVQKDUpIw'
     """
-    return base64.b64encode(payload.encode(UNICODE_ENCODING)) if payload else payload
+    if _isbytes(payload):
+        return _base64(bytes(payload), kwargs.get("urlsafe", False), kwargs.get("padding", True))
+
+    return _text(_base64(payload.encode(UNICODE_ENCODING), kwargs.get("urlsafe", False), kwargs.get("padding", True))) if payload else payload
 
 
+# Regular expressions used by between (the last AND/OR clause with '>' or '=', and any other '>' comparison)
+BETWEEN_GREATER_REGEX = re.compile(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^>]+?)\s*>\s*([^>]+)\s*\Z")
+BETWEEN_GREATER_ANY_REGEX = re.compile(r"\s*>\s*(\d+|'[^']+'|\w+\(\d+\))")
+BETWEEN_EQUALS_REGEX = re.compile(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^=]+?)\s*=\s*(\w+)\s*")
 
 def between(payload, **kwargs):
     """
@@ -73,16 +365,16 @@ def between(payload, **kwargs):
     """
     retVal = payload
     if payload:
-        match = re.search(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^>]+?)\s*>\s*([^>]+)\s*\Z", payload)
+        match = _guard(BETWEEN_GREATER_REGEX, payload).search(payload)
 
         if match:
             _ = "%s %s NOT BETWEEN 0 AND %s" % (match.group(2), match.group(4), match.group(5))
             retVal = retVal.replace(match.group(0), _)
         else:
-            retVal = re.sub(r"\s*>\s*(\d+|'[^']+'|\w+\(\d+\))", " NOT BETWEEN 0 AND \g<1>", payload)
+            retVal = _guard(BETWEEN_GREATER_ANY_REGEX, payload).sub(" NOT BETWEEN 0 AND \g<1>", payload)
 
         if retVal == payload:
-            match = re.search(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^=]+?)\s*=\s*(\w+)\s*", payload)
+            match = _guard(BETWEEN_EQUALS_REGEX, payload).search(payload)
 
             if match:
                 _ = "%s %s BETWEEN %s AND %s" % (match.group(2), match.group(4), match.group(5), match.group(5))
@@ -90,6 +382,8 @@ def between(payload, **kwargs):
     return retVal
 
 
+# Regular expression used by bluecoat and equaltolike (equal operator with surrounding whitespace)
+EQUALS_REGEX = re.compile(r"\s*=\s*")
 
 def bluecoat(payload, **kwargs):
     """
@@ -106,17 +400,10 @@ def bluecoat(payload, **kwargs):
     >>> tamper('SELECT id FROM users WHERE id = 1')
     'SELECT%09id FROM%09users WHERE%09id LIKE 1'
     """
-    def process(match):
-        word = match.group('word')
-        if word.upper() in kb.keywords:
-            return match.group().replace(word, "%s%%09" % word)
-        else:
-            return match.group()
     retVal = payload
     if payload:
-        retVal = re.sub(r"\b(?P<word>[A-Z_]+)(?=[^\w(]|\Z)", lambda match: process(match), retVal)
-        retVal = re.sub(r"\s*=\s*", " LIKE ", retVal)
-        retVal = retVal.replace("%09 ", "%09")
+        retVal = _rewritekeywords(retVal, UPPERCASE_KEYWORD_REGEX, _rewritetable("%s%%09"), after="%09")
+        retVal = _guard(EQUALS_REGEX, retVal).sub(lambda match: "LIKE " if match.string.endswith("%09", 0, match.start()) else " LIKE ", retVal)
     return retVal
 
 
@@ -132,6 +419,13 @@ def chardoubleencode(payload, **kwargs):
     >>> tamper('SELECT FIELD FROM%20TABLE')
     '%2553%2545%254C%2545%2543%2554%2520%2546%2549%2545%254C%2544%2520%2546%2552%254F%254D%2520%2554%2541%2542%254C%2545'
     """
+    if _isbytes(payload):
+        return _hexencodebytes(payload, b"%25", b"%25")
+
+    # low-jitter mode writes into a preallocated buffer instead of growing the result character by character
+    if kwargs.get("lowjitter") and _singlebytes(payload):
+        return _hexencodebytes(_singlebytes(payload), b"%25", b"%25").decode("latin1")
+
     retVal = payload
     if payload:
         retVal = ""
@@ -164,7 +458,16 @@ def charencode(payload, **kwargs):
 
     >>> tamper('SELECT FIELD FROM%20TABLE')
     '%53%45%4C%45%43%54%20%46%49%45%4C%44%20%46%52%4F%4D%20%54%41%42%4C%45'
+    >>> tamper(b'SELECT FIELD FROM%20TABLE') == b'%53%45%4C%45%43%54%20%46%49%45%4C%44%20%46%52%4F%4D%20%54%41%42%4C%45'
+    True
     """
+    if _isbytes(payload):
+        return _hexencodebytes(payload, b"%", b"%")
+
+    # low-jitter mode writes into a preallocated buffer instead of growing the result character by character
+    if kwargs.get("lowjitter") and _singlebytes(payload):
+        return _hexencodebytes(_singlebytes(payload), b"%", b"%").decode("latin1")
+
     retVal = payload
     if payload:
         retVal = ""
@@ -257,10 +560,12 @@ def equaltolike(payload, **kwargs):
         return word
     retVal = payload
     if payload:
-        retVal = re.sub(r"\s*=\s*", lambda match: process(match), retVal)
+        retVal = _guard(EQUALS_REGEX, retVal).sub(lambda match: process(match), retVal)
     return retVal
 
 
+# Regular expression used by greatest (the last AND/OR clause with '>')
+GREATEST_REGEX = re.compile(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^>]+?)\s*>\s*([^>#-]+)")
 
 def greatest(payload, **kwargs):
     """
@@ -284,7 +589,7 @@ def greatest(payload, **kwargs):
     retVal = payload
 
     if payload:
-        match = re.search(r"(?i)(\b(AND|OR)\b\s+)(?!.*\b(AND|OR)\b)([^>]+?)\s*>\s*([^>#-]+)", payload)
+        match = _guard(GREATEST_REGEX, payload).search(payload)
 
         if match:
             _ = "%sGREATEST(%s,%s+1)=%s" % (match.group(1), match.group(4), match.group(5), match.group(4))
@@ -316,18 +621,10 @@ def halfversionedmorekeywords(payload, **kwargs):
     "value'/*!0UNION/*!0ALL/*!0SELECT/*!0CONCAT(/*!0CHAR(58,107,112,113,58),/*!0IFNULL(CAST(/*!0CURRENT_USER()/*!0AS/*!0CHAR),/*!0CHAR(32)),/*!0CHAR(58,97,110,121,58)),/*!0NULL,/*!0NULL#/*!0AND 'QDWa'='QDWa"
     """
 
-    def process(match):
-        word = match.group('word')
-        if word.upper() in kb.keywords and word.upper() not in IGNORE_SPACE_AFFECTED_KEYWORDS:
-            return match.group().replace(word, "/*!0%s" % word)
-        else:
-            return match.group()
-
     retVal = payload
 
     if payload:
-        retVal = re.sub(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=\W|\Z)", lambda match: process(match), retVal)
-        retVal = retVal.replace(" /*!0", "/*!0")
+        retVal = _rewritekeywords(retVal, KEYWORD_REGEX, _rewritetable("/*!0%s", IGNORE_SPACE_AFFECTED_KEYWORDS), before="/*!0")
 
     return retVal
 
@@ -423,16 +720,24 @@ def lowercase(payload, **kwargs):
 
     >>> tamper('INSERT')
     'insert'
+    >>> tamper('1 OR 1 ORDER')
+    '1 or 1 orDER'
     """
 
     retVal = payload
 
     if payload:
-        for match in re.finditer(r"[A-Za-z_]+", retVal):
+        seen = set()
+
+        for match in re.finditer(r"[A-Za-z_]+", payload):
             word = match.group()
 
-            if word.upper() in kb.keywords:
-                retVal = retVal.replace(word, word.lower())
+            # each spelling is replaced once (lowering doesn't create new occurrences of it)
+            if word not in seen and word.upper() in kb.keywords:
+                seen.add(word)
+
+                if word != word.lower():
+                    retVal = retVal.replace(word, word.lower())
 
     return retVal
 
@@ -543,6 +848,9 @@ def multiplespaces(payload, **kwargs):
 
 
 
+# Keywords processed by nonrecursivereplacement
+NONRECURSIVE_KEYWORDS = ("UNION", "SELECT", "INSERT", "UPDATE", "FROM", "WHERE")
+
 def nonrecursivereplacement(payload, **kwargs):
     """
     Replaces predefined SQL keywords with representations
@@ -556,7 +864,7 @@ def nonrecursivereplacement(payload, **kwargs):
     '1 UNIOUNIONN SELESELECTCT 2--'
     """
 
-    keywords = ("UNION", "SELECT", "INSERT", "UPDATE", "FROM", "WHERE")
+    keywords = NONRECURSIVE_KEYWORDS
     retVal = payload
 
     warnMsg = "currently only couple of keywords are being processed %s. " % str(keywords)
@@ -584,6 +892,9 @@ def overlongutf8(payload, **kwargs):
     'SELECT%C0%AAFIELD%C0%AAFROM%C0%AATABLE%C0%AAWHERE%C0%AA2%C0%BE1'
     """
 
+    if _isbytes(payload):
+        return _mapbytes(payload, OVERLONG_BYTES_TABLE)
+
     retVal = payload
 
     if payload:
@@ -625,6 +936,9 @@ def percentage(payload, **kwargs):
     '%S%E%L%E%C%T %F%I%E%L%D %F%R%O%M %T%A%B%L%E'
     """
 
+    if _isbytes(payload):
+        return _mapbytes(payload, PERCENTAGE_BYTES_TABLE)
+
     if payload:
         retVal = ""
         i = 0
@@ -664,6 +978,8 @@ def randomcase(payload, **kwargs):
     >>> random.seed(0)
     >>> tamper('INSERT')
     'INseRt'
+    >>> tamper('INSERT', lowjitter=True) not in ('INSERT', 'insert')
+    True
     """
 
     retVal = payload
@@ -682,6 +998,16 @@ def randomcase(payload, **kwargs):
                     if len(_) > 1 and _ not in (_.lower(), _.upper()):
                         break
 
+                    # bounded time (single pass) - flipping case of one (random) letter instead of retrying
+                    if kwargs.get("lowjitter"):
+                        letters = [i for i in xrange(len(_)) if _[i].isalpha()]
+
+                        if len(letters) > 1:
+                            i = letters[randomRange(0, len(letters) - 1)]
+                            _ = _[:i] + _[i].swapcase() + _[i + 1:]
+
+                        break
+
                 retVal = retVal.replace(word, _)
 
     return retVal
@@ -889,18 +1215,16 @@ def space2morehash(payload, **kwargs):
     """
 
     def process(match):
-        word = match.group('word')
         randomStr = ''.join(random.choice(string.ascii_uppercase + string.ascii_lowercase) for _ in xrange(random.randint(6, 12)))
+        rewrite = table[match.group('word')]
 
-        if word.upper() in kb.keywords and word.upper() not in IGNORE_SPACE_AFFECTED_KEYWORDS:
-            return match.group().replace(word, "%s%%23%s%%0A" % (word, randomStr))
-        else:
-            return match.group()
+        return match.group() if rewrite is None else rewrite + randomStr + "%0A"
 
     retVal = ""
 
     if payload:
-        payload = re.sub(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=\W|\Z)", lambda match: process(match), payload)
+        table = _rewritetable("%s%%23", IGNORE_SPACE_AFFECTED_KEYWORDS)
+        payload = KEYWORD_REGEX.sub(process, payload)
 
         for i in xrange(len(payload)):
             if payload[i].isspace():
@@ -918,6 +1242,9 @@ def space2morehash(payload, **kwargs):
 
 
 
+# Blank characters used by space2mssqlblank (the last one is not used after a trailing comment)
+MSSQL_BLANKS = ('%01', '%02', '%03', '%04', '%05', '%06', '%07', '%08', '%09', '%0B', '%0C', '%0D', '%0E', '%0F', '%0A')
+
 def space2mssqlblank(payload, **kwargs):
     """
     Replaces space character (' ') with a random blank character from a
@@ -954,7 +1281,7 @@ def space2mssqlblank(payload, **kwargs):
     #   CR      0D      carriage return
     #   SO      0E      shift out
     #   SI      0F      shift in
-    blanks = ('%01', '%02', '%03', '%04', '%05', '%06', '%07', '%08', '%09', '%0B', '%0C', '%0D', '%0E', '%0F', '%0A')
+    blanks = MSSQL_BLANKS
     retVal = payload
 
     if payload:
@@ -1070,6 +1397,9 @@ def space2plus(payload, **kwargs):
 
 
 
+# Blank characters used by space2randomblank
+RANDOM_BLANKS = ("%09", "%0A", "%0C", "%0D")
+
 def space2randomblank(payload, **kwargs):
     """
     Replaces space character (' ') with a random blank character from a
@@ -1094,7 +1424,7 @@ def space2randomblank(payload, **kwargs):
     #   LF      0A      new line
     #   FF      0C      new page
     #   CR      0D      carriage return
-    blanks = ("%09", "%0A", "%0C", "%0D")
+    blanks = RANDOM_BLANKS
     retVal = payload
 
     if payload:
@@ -1180,6 +1510,8 @@ def unionalltounion(payload, **kwargs):
 
 
 
+# Regular expression used by unmagicquotes (tautology behind the quote, e.g. AND 1=1)
+UNMAGICQUOTES_REGEX = re.compile(r"(?i)\s*(AND|OR)[\s(]+([^\s]+)\s*(=|LIKE)\s*\2")
 
 def unmagicquotes(payload, **kwargs):
     """
@@ -1199,19 +1531,11 @@ def unmagicquotes(payload, **kwargs):
     retVal = payload
 
     if payload:
-        found = False
-        retVal = ""
-
-        for i in xrange(len(payload)):
-            if payload[i] == '\'' and not found:
-                retVal += "%bf%27"
-                found = True
-            else:
-                retVal += payload[i]
-                continue
+        index = payload.find('\'')
 
-        if found:
-            _ = re.sub(r"(?i)\s*(AND|OR)[\s(]+([^\s]+)\s*(=|LIKE)\s*\2", "", retVal)
+        if index >= 0:
+            retVal = "%s%%bf%%27%s" % (payload[:index], payload[index + 1:])
+            _ = _guard(UNMAGICQUOTES_REGEX, retVal).sub("", retVal)
             if _ != retVal:
                 retVal = _
                 retVal += "-- "
@@ -1263,18 +1587,10 @@ def versionedkeywords(payload, **kwargs):
     '1/*!UNION*//*!ALL*//*!SELECT*//*!NULL*/,/*!NULL*/, CONCAT(CHAR(58,104,116,116,58),IFNULL(CAST(CURRENT_USER()/*!AS*//*!CHAR*/),CHAR(32)),CHAR(58,100,114,117,58))#'
     """
 
-    def process(match):
-        word = match.group('word')
-        if word.upper() in kb.keywords:
-            return match.group().replace(word, "/*!%s*/" % word)
-        else:
-            return match.group()
-
     retVal = payload
 
     if payload:
-        retVal = re.sub(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=[^\w(]|\Z)", lambda match: process(match), retVal)
-        retVal = retVal.replace(" /*!", "/*!").replace("*/ ", "*/")
+        retVal = _rewritekeywords(retVal, NONFUNCTION_KEYWORD_REGEX, _rewritetable("/*!%s*/"), before="/*!", after="*/")
 
     return retVal
 
@@ -1299,18 +1615,10 @@ def versionedmorekeywords(payload, **kwargs):
     '1/*!UNION*//*!ALL*//*!SELECT*//*!NULL*/,/*!NULL*/,/*!CONCAT*/(/*!CHAR*/(58,122,114,115,58),/*!IFNULL*/(CAST(/*!CURRENT_USER*/()/*!AS*//*!CHAR*/),/*!CHAR*/(32)),/*!CHAR*/(58,115,114,121,58))#'
     """
 
-    def process(match):
-        word = match.group('word')
-        if word.upper() in kb.keywords and word.upper() not in IGNORE_SPACE_AFFECTED_KEYWORDS:
-            return match.group().replace(word, "/*!%s*/" % word)
-        else:
-            return match.group()
-
     retVal = payload
 
     if payload:
-        retVal = re.sub(r"(?<=\W)(?P<word>[A-Za-z_]+)(?=\W|\Z)", lambda match: process(match), retVal)
-        retVal = retVal.replace(" /*!", "/*!").replace("*/ ", "*/")
+        retVal = _rewritekeywords(retVal, KEYWORD_REGEX, _rewritetable("/*!%s*/", IGNORE_SPACE_AFFECTED_KEYWORDS), before="/*!", after="*/")
 
     return retVal
 
@@ -1332,3 +1640,1179 @@ def xforwardedfor(payload, **kwargs):
     headers = kwargs.get("headers", {})
     headers["X-Forwarded-For"] = randomIP()
     return payload
+
+
+
+# Payload length above which guarded regular expressions get replaced with their linear fallbacks
+LINEAR_FALLBACK_THRESHOLD = 1024
+
+# Regular expressions used by linear fallbacks
+LOGICAL_WORD_REGEX = re.compile(r"(?i)\b(AND|OR)\b")
+LOGICAL_ANY_REGEX = re.compile(r"(?i)AND|OR")
+COMPARISON_REGEX = re.compile(r"(?i)=|LIKE")
+BLANKS_REGEX = re.compile(r"\s*")
+NONBLANKS_REGEX = re.compile(r"\S*")
+PARENS_REGEX = re.compile(r"\(*")
+BLANKS_PARENS_REGEX = re.compile(r"[\s(]*")
+WORD_CHARS_REGEX = re.compile(r"\w+")
+GREATEST_OPERAND_REGEX = re.compile(r"[^>#-]+")
+
+class _Match(object):
+    """
+    Match object (subset used by tampers) of linear fallbacks, with spans
+    of groups (None for a group not taking part in the match)
+    """
+
+    def __init__(self, string, spans):
+        self.string = string
+        self.spans = spans
+
+    def group(self, index=0):
+        return self.string[self.spans[index][0]:self.spans[index][1]] if self.spans[index] else None
+
+    def start(self, index=0):
+        return self.spans[index][0]
+
+    def end(self, index=0):
+        return self.spans[index][1]
+
+def _greatertail(payload, operator):
+    """
+    Returns (span of the operand, match end) of the rest of between's
+    greater than clause (the only '>' with an operand up to the end)
+    """
+
+    if operator + 1 == len(payload) or payload.find('>', operator + 1) >= 0:
+        return None
+
+    return (min(BLANKS_REGEX.match(payload, operator + 1).end(), len(payload) - 1), len(payload)), len(payload)
+
+def _equalstail(payload, operator):
+    """
+    Returns (span of the operand, match end) of the rest of between's
+    equals clause (word operand and trailing whitespace)
+    """
+
+    match = WORD_CHARS_REGEX.match(payload, BLANKS_REGEX.match(payload, operator + 1).end())
+
+    return (match.span(), BLANKS_REGEX.match(payload, match.end()).end()) if match else None
+
+def _greatesttail(payload, operator):
+    """
+    Returns (span of the operand, match end) of the rest of greatest's
+    clause (operand up to a '>' or a comment)
+    """
+
+    start = BLANKS_REGEX.match(payload, operator + 1).end()
+
+    if start == len(payload) or payload[start] in ">#-":
+        if start == operator + 1:
+            return None
+
+        start -= 1
+
+    end = GREATEST_OPERAND_REGEX.match(payload, start).end()
+
+    return (start, end), end
+
+class _LastClause(object):
+    """
+    Linear counterpart of BETWEEN_GREATER_REGEX, BETWEEN_EQUALS_REGEX and
+    GREATEST_REGEX (the first AND/OR clause with no other AND/OR following
+    on the same line, up to a given operator), with the rest of the clause
+    matched by a given tail function. Candidates are evaluated from
+    positions of AND/OR words, operators and line breaks found once
+    (instead of rescanning up to the end of line at each whitespace)
+
+    >>> _LastClause('>', _greatesttail).search('1 AND 2 OR A > B').group(4)
+    'A'
+    """
+
+    def __init__(self, operator, tail):
+        self.operator = operator
+        self.tail = tail
+
+    def search(self, payload):
+        words = list(LOGICAL_WORD_REGEX.finditer(payload))
+        operator = newline = -1
+        tails = {}
+
+        for i in xrange(len(words)):
+            word = words[i]
+            start, end = word.end(), BLANKS_REGEX.match(payload, word.end()).end()
+
+            if end == start:
+                continue
+
+            # first operator and first line end behind the whitespace (both only move forward)
+            if operator < end:
+                operator = payload.find(self.operator, end)
+
+                if operator < 0:
+                    return None
+
+            if newline < end:
+                newline = payload.find('\n', end)
+                newline = len(payload) if newline < 0 else newline
+
+            # lookahead holds for the (greedy) whitespace if next AND/OR is on another line, otherwise only up to its last line break
+            if (words[i + 1].start() if i + 1 < len(words) else len(payload)) >= newline:
+                position = end if end < operator else end - 1
+            else:
+                position = payload.rfind('\n', start + 1, end)
+
+            if position <= start:
+                continue
+
+            if operator not in tails:
+                tails[operator] = self.tail(payload, operator)
+
+            if tails[operator] is None:
+                continue
+
+            span, last = tails[operator]
+
+            return _Match(payload, ((word.start(), last), (word.start(), position), word.span(1), None, (position, max(position + 1, position + len(payload[position:operator].rstrip()))), span))
+
+        return None
+
+class _Tautologies(object):
+    """
+    Linear counterpart of UNMAGICQUOTES_REGEX (substitution with a plain
+    replacement string)
+
+    >>> _Tautologies().sub('', "1%bf%27 AND ((1=((1-- ")
+    '1%bf%27-- '
+    """
+
+    def _clause(self, payload, start, end, comparisons, space):
+        """
+        Returns end of the clause (None if not matching) behind AND/OR at a
+        given position, with whitespace and parentheses up to a given end,
+        preferring (as backtracking does) the latest operand start and then
+        the latest operand end
+        """
+
+        import bisect
+
+        first = end
+
+        while first > start + 1 and payload[first - 1] == '(':
+            first -= 1
+
+        # operand candidates start at or after the first parenthesis behind the last whitespace and end at most at the next whitespace
+        candidates = [(_, _) for _ in comparisons[bisect.bisect_right(comparisons, first):bisect.bisect_left(comparisons, space)]]
+
+        if space < len(payload):
+            comparison = BLANKS_REGEX.match(payload, space).end()
+
+            if COMPARISON_REGEX.match(payload, comparison):
+                candidates.append((space, comparison))
+
+        best = None
+
+        # latest operand ends first (so the backreference gets compared only for candidates that would be preferred)
+        for stop, comparison in reversed(candidates):
+            operand = BLANKS_REGEX.match(payload, comparison + (1 if payload[comparison] == '=' else 4)).end()
+            count = PARENS_REGEX.match(payload, operand).end() - operand
+
+            # backreference of parentheses only operand vs. operand continuing behind the parentheses (with exactly as many in front)
+            if stop <= end:
+                begin = stop - 1 if count else None
+            else:
+                begin = end - count
+
+            if begin is None or begin < first or best and begin <= best[0]:
+                continue
+
+            if stop > end and (payload[end].lower() != payload[operand + count:operand + count + 1].lower() or payload[end:stop].lower() != payload[operand + count:operand + count + stop - end].lower()):
+                continue
+
+            best = (begin, stop, operand + stop - begin)
+
+        # parentheses only operand in front of whitespace ending right at the comparison
+        if best is None and first == end and COMPARISON_REGEX.match(payload, end):
+            stop = end
+
+            while stop > start and payload[stop - 1].isspace():
+                stop -= 1
+
+            operand = BLANKS_REGEX.match(payload, end + (1 if payload[end] == '=' else 4)).end()
+
+            if stop - 1 > start and stop < end and payload[stop - 1] == '(' and payload[operand:operand + 1] == '(':
+                best = (stop - 1, stop, operand + 1)
+
+        return best[2] if best else None
+
+    def sub(self, replacement, payload):
+        comparisons = [_.start() for _ in COMPARISON_REGEX.finditer(payload)]
+        retVal = []
+        index = space = 0
+
+        for word in LOGICAL_ANY_REGEX.finditer(payload):
+            if word.start() < index:
+                continue
+
+            end = BLANKS_PARENS_REGEX.match(payload, word.end()).end()
+
+            if end == word.end():
+                continue
+
+            # first whitespace behind the operand start (only moves forward)
+            if space < end:
+                space = NONBLANKS_REGEX.match(payload, end).end()
+
+            end = self._clause(payload, word.end(), end, comparisons, space)
+
+            if end is None:
+                continue
+
+            start = word.start()
+
+            while start > index and payload[start - 1].isspace():
+                start -= 1
+
+            retVal.append(payload[index:start])
+            retVal.append(replacement)
+            index = end
+
+        retVal.append(payload[index:])
+
+        return "".join(retVal)
+
+# Linear fallbacks of regular expressions prone to catastrophic backtracking (on long whitespace runs, clauses or parentheses)
+LINEAR_FALLBACKS = {
+    BETWEEN_GREATER_REGEX: _LastClause('>', _greatertail),
+    BETWEEN_GREATER_ANY_REGEX: re.compile(r"(?:(?<!\s)\s*|(?<=\s))>\s*(\d+|'[^']+'|\w+\(\d+\))"),
+    BETWEEN_EQUALS_REGEX: _LastClause('=', _equalstail),
+    EQUALS_REGEX: re.compile(r"(?:(?<!\s)\s*|(?<=\s))=\s*"),
+    GREATEST_REGEX: _LastClause('>', _greatesttail),
+    UNMAGICQUOTES_REGEX: _Tautologies(),
+}
+
+def _guard(regex, payload):
+    """
+    Returns linear fallback of a given regular expression for payloads
+    longer than LINEAR_FALLBACK_THRESHOLD (otherwise the regular expression)
+
+    >>> _guard(EQUALS_REGEX, '1=1') is EQUALS_REGEX
+    True
+    """
+
+    return LINEAR_FALLBACKS.get(regex, regex) if len(payload) > LINEAR_FALLBACK_THRESHOLD else regex
+
+
+# Characters considered as spaces by str.isspace() (ASCII only)
+SPACE_CHARS = " \t\n\r\x0b\x0c"
+
+# Characters used by inline/trailing SQL comments
+COMMENT_CHARS = "#-/*"
+
+# Default properties of a tamper function (see TAMPER_PROPERTIES)
+DEFAULT_TAMPER_PROPERTIES = {
+    "deterministic": True,      # same payload always results in the same output
+    "reads": None,              # characters the result depends on (None for any)
+    "writes": None,             # characters the tamper may add or remove (None for any)
+    "expansion": 1,             # worst-case output/input length ratio (ASCII payloads)
+    "overhead": 0,              # worst-case number of characters added on top of expansion
+    "shrinks": False,           # output can be shorter than input
+    "unbounded": False,         # output length has no linear bound (e.g. nested rewrites)
+    "chunksafe": False,         # tamper(a + b) == tamper(a) + tamper(b) (split outside of %XX)
+    "headers": False,           # touches only HTTP headers (payload passes through)
+    "anchor": None,             # position dependent edit ("start", "first" or "end")
+    "keepsescapes": False,      # already encoded %XX sequences pass through verbatim
+    "chars": None,              # no-op unless payload contains one of these characters
+    "literals": None,           # no-op unless payload contains one of these (upper case) literals
+    "idempotent": False,        # tamper(tamper(payload)) == tamper(payload)
+    "strips": None,             # characters never left in the output
+    "breaks": None,             # (upper case) literals never left in the output
+    "recases": False,           # only sets case of keywords (regardless of their case in input)
+}
+
+# Characters left in the output of percent-encoding tampers (i.e. %XX sequences)
+ENCODED_CHARS = "%" + string.hexdigits
+
+# Characters never left in the output of percent-encoding tampers
+NONENCODED_CHARS = "".join(_ for _ in string.printable if _ not in ENCODED_CHARS)
+
+# Machine-readable properties of each tamper function
+TAMPER_PROPERTIES = {
+    "apostrophemask": dict(chars="'", reads="'", writes="'%EFBC87", expansion=9, chunksafe=True, idempotent=True, strips="'"),
+    "apostrophenullencode": dict(chars="'", reads="'", writes="'%027", expansion=6, chunksafe=True, idempotent=True, strips="'"),
+    "appendnullbyte": dict(reads="", writes="%0", anchor="end", overhead=3),
+    "base64encode": dict(expansion=4.0 / 3, overhead=3),
+    "between": dict(chars=">=", expansion=10, overhead=20),
+    "bluecoat": dict(expansion=6, shrinks=True),
+    "chardoubleencode": dict(expansion=5, chunksafe=True, strips=NONENCODED_CHARS),
+    "charencode": dict(expansion=3, chunksafe=True, keepsescapes=True, idempotent=True, strips=NONENCODED_CHARS),
+    "charunicodeencode": dict(expansion=6, chunksafe=True, strips=NONENCODED_CHARS.replace('u', "")),
+    "concat2concatws": dict(literals=("CONCAT(",), reads="CONAT(", writes="CONAT_WS(MIDHR0,)", expansion=4, idempotent=True),
+    "equaltolike": dict(chars="=", reads="=" + SPACE_CHARS, writes="=LIKE" + SPACE_CHARS, expansion=6, idempotent=True, strips="="),
+    "greatest": dict(chars=">", expansion=3, overhead=14, idempotent=True),
+    "halfversionedmorekeywords": dict(expansion=3, shrinks=True, breaks=("UNION ALL SELECT",)),
+    "ifnull2ifisnull": dict(literals=("IFNULL(",), reads="IFNUL(), ", writes="IFNULS(), ", expansion=2, overhead=4, unbounded=True, idempotent=True),
+    "informationschemacomment": dict(literals=("INFORMATION_SCHEMA.",), writes="/*", expansion=1.25, idempotent=True, breaks=("INFORMATION_SCHEMA.",)),
+    "lowercase": dict(recases=True),
+    "modsecurityversioned": dict(chars=" ", deterministic=False, anchor="start", overhead=10),
+    "modsecurityzeroversioned": dict(chars=" ", anchor="start", overhead=10),
+    "multiplespaces": dict(deterministic=False, writes=" ", expansion=4),
+    "nonrecursivereplacement": dict(deterministic=False, expansion=2),
+    "overlongutf8": dict(expansion=6, chunksafe=True, keepsescapes=True, idempotent=True, strips="".join(_ for _ in NONENCODED_CHARS if not _.isalnum())),
+    "percentage": dict(expansion=2, chunksafe=True, keepsescapes=True),
+    "randomcase": dict(deterministic=False, recases=True),
+    "randomcomments": dict(deterministic=False, writes="/*", expansion=5),
+    "securesphere": dict(reads="", writes=" and'0hvig=", anchor="end", overhead=24),
+    "space2comment": dict(chars=SPACE_CHARS, reads=SPACE_CHARS + "'\"", writes=SPACE_CHARS + "/*", expansion=4),
+    "space2dash": dict(chars=SPACE_CHARS, deterministic=False, expansion=17),
+    "space2hash": dict(chars=SPACE_CHARS, deterministic=False, expansion=18),
+    "space2morehash": dict(deterministic=False, expansion=19),
+    "space2mssqlblank": dict(chars=SPACE_CHARS, deterministic=False, reads=SPACE_CHARS + "'\"#-", writes=SPACE_CHARS + "%0123456789ABCDEF", expansion=3),
+    "space2mysqldash": dict(chars=SPACE_CHARS, reads=SPACE_CHARS + "#-", writes=SPACE_CHARS + "-%0A", expansion=5, idempotent=True),
+    "space2plus": dict(chars=SPACE_CHARS, reads=SPACE_CHARS + "'\"", writes=SPACE_CHARS + "+"),
+    "space2randomblank": dict(chars=SPACE_CHARS, deterministic=False, reads=SPACE_CHARS + "'\"", writes=SPACE_CHARS + "%09ACD", expansion=3),
+    "sp_password": dict(reads="#- ", writes="-_ spaword", anchor="end", overhead=14),
+    "symboliclogical": dict(literals=("AND", "OR"), writes="ANDOR%267C", expansion=3, idempotent=True),
+    "unionalltounion": dict(literals=("UNION ALL SELECT",), reads="UNIOALSECT ", writes="AL ", shrinks=True, idempotent=True, breaks=("UNION ALL SELECT",)),
+    "unmagicquotes": dict(chars="'", anchor="first", overhead=8, shrinks=True),
+    "varnish": dict(reads="", writes="", chunksafe=True, headers=True),
+    "versionedkeywords": dict(expansion=4, shrinks=True, breaks=("UNION ALL SELECT",)),
+    "versionedmorekeywords": dict(expansion=4, shrinks=True, breaks=("UNION ALL SELECT",)),
+    "xforwardedfor": dict(deterministic=False, reads="", writes="", chunksafe=True, headers=True),
+}
+
+# High resolution timer (where available)
+_timer = getattr(time, "perf_counter", time.time)
+
+# Assumed cost (seconds per input byte) of tampers without collected statistics
+DEFAULT_BYTE_COST = 1e-6
+
+# Collected per-tamper statistics (calls, input bytes, elapsed seconds, skips)
+TAMPER_STATS = {}
+
+def _gettamper(tamper):
+    """
+    Returns tamper function for a given tamper (function or name)
+    """
+
+    return tamper if callable(tamper) else globals()[tamper]
+
+def _codenames(code):
+    """
+    Returns global names used by a given code object (including nested
+    functions, lambdas and comprehensions)
+    """
+
+    retVal = set(code.co_names)
+
+    for _ in code.co_consts:
+        if hasattr(_, "co_names"):
+            retVal |= _codenames(_)
+
+    return retVal
+
+def tamperversion(tamper, _cache={}):
+    """
+    Returns version hash of a given tamper (function or name), changing
+    whenever its source (or the source of module functions and classes it
+    uses, or value of module constants it reads) does
+
+    >>> tamperversion('charencode') == tamperversion(charencode)
+    True
+    """
+
+    import hashlib
+    import inspect
+    import marshal
+
+    function = _gettamper(tamper)
+
+    if function not in _cache:
+        digest = hashlib.md5()
+        pending, seen = [function], set()
+
+        def stable(value):
+            """
+            Returns representation of a module constant not depending on
+            object addresses (functions and classes it refers to get hashed
+            on their own)
+            """
+
+            if inspect.isfunction(value) or inspect.isclass(value):
+                pending.append(value)
+                return "<%s>" % value.__name__
+            elif isinstance(value, type(ENCODED_BYTES_REGEX)):
+                return "re(%r, %d)" % (value.pattern, value.flags)
+            elif isinstance(value, dict):
+                return "{%s}" % ", ".join(sorted("%s: %s" % (stable(_), stable(value[_])) for _ in value))
+            elif isinstance(value, (set, frozenset)):
+                return "set(%s)" % ", ".join(sorted(stable(_) for _ in value))
+            elif isinstance(value, (tuple, list)):
+                return "(%s)" % ", ".join(stable(_) for _ in value)
+            elif getattr(type(value), "__module__", None) == __name__:
+                pending.append(type(value))
+                return "%s(%s)" % (type(value).__name__, stable(getattr(value, "__dict__", {})))
+            elif value is None or isinstance(value, (bool, int, float, str, bytes, type(u""))):
+                return repr(value)
+            else:
+                return "<%s>" % type(value).__name__
+
+        while pending:
+            _ = pending.pop()
+
+            if _ in seen:
+                continue
+
+            seen.add(_)
+
+            # classes get hashed by their methods and attributes (source lookup of a class parses the whole module)
+            if inspect.isclass(_):
+                digest.update(("class %s(%s)" % (_.__name__, ", ".join(__.__name__ for __ in _.__bases__))).encode("utf8"))
+
+                for name, value in sorted(vars(_).items()):
+                    if inspect.isfunction(value):
+                        pending.append(value)
+                    elif not name.startswith("__"):
+                        digest.update(("%s.%s=%s;" % (_.__name__, name, stable(value))).encode("utf8"))
+
+                continue
+
+            try:
+                digest.update(inspect.getsource(_).encode("utf8"))
+            except (IOError, TypeError):
+                digest.update(marshal.dumps(_.__code__))
+
+            for name in sorted(_codenames(_.__code__)):
+                value = globals().get(name)
+
+                if inspect.isfunction(value) or inspect.isclass(value) and getattr(value, "__module__", None) == __name__:
+                    pending.append(value)
+                elif name.isupper() and value is not None:
+                    digest.update(("%s=%s;" % (name, stable(value))).encode("utf8"))
+
+        _cache[function] = digest.hexdigest()
+
+    return _cache[function]
+
+def tamperproperties(tamper):
+    """
+    Returns properties of a given tamper (function or name)
+
+    >>> tamperproperties('charencode')['expansion']
+    3
+    """
+
+    retVal = dict(DEFAULT_TAMPER_PROPERTIES)
+    retVal.update(TAMPER_PROPERTIES.get(getattr(tamper, "__name__", tamper), {}))
+
+    return retVal
+
+def tamperchain(payload, tampers, **kwargs):
+    """
+    Runs payload through a chain of tampers, collecting statistics (into
+    TAMPER_STATS or a given statistics dictionary)
+
+    >>> tamperchain('1 AND 1=1', ('space2comment', 'appendnullbyte'))
+    '1/**/AND/**/1=1%00'
+    """
+
+    retVal = payload
+    scanned, chars, upper = None, None, None
+    statistics = kwargs.pop("statistics", TAMPER_STATS)
+
+    for tamper in tampers:
+        function = _gettamper(tamper)
+        properties = tamperproperties(function)
+        stats = statistics.setdefault(function.__name__, [0, 0, 0.0, 0])
+
+        if properties["chars"] is not None or properties["literals"] is not None:
+            # single (shared) scan of the payload until some stage changes it
+            if scanned is not retVal:
+                scanned, chars, upper = retVal, set(retVal or ""), None
+
+            if properties["chars"] is not None and chars.isdisjoint(properties["chars"]):
+                stats[3] += 1
+                continue
+
+            if properties["literals"] is not None:
+                if upper is None:
+                    upper = (retVal or "").upper()
+
+                if not any(_ in upper for _ in properties["literals"]):
+                    stats[3] += 1
+                    continue
+
+        start = _timer()
+        length = len(retVal) if retVal else 0
+        retVal = function(retVal, **kwargs)
+        stats[0] += 1
+        stats[1] += length
+        stats[2] += _timer() - start
+
+    return retVal
+
+def tamperreport():
+    """
+    Returns textual report of collected tamper statistics
+
+    >>> TAMPER_STATS.clear()
+    >>> _ = tamperchain('1 AND 1=1', ('apostrophemask', 'space2plus'))
+    >>> print(tamperreport())  # doctest: +ELLIPSIS
+    tamper                       calls    skips      bytes     usec/call
+    apostrophemask                   0        1          0           0.0
+    space2plus                       1        0          9 ...
+    """
+
+    retVal = "%-24s %9s %8s %10s %13s" % ("tamper", "calls", "skips", "bytes", "usec/call")
+
+    for name in sorted(TAMPER_STATS):
+        calls, length, elapsed, skips = TAMPER_STATS[name]
+        retVal += "\n%-24s %9d %8d %10d %13.1f" % (name, calls, skips, length, 1e6 * elapsed / calls if calls else 0)
+
+    return retVal
+
+def jitter(latencies):
+    """
+    Returns median, 99th percentile and their spread (p99 - p50) of given latencies
+
+    >>> jitter(range(1, 101))
+    (51, 100, 49)
+    """
+
+    latencies = sorted(latencies)
+
+    if not latencies:
+        return 0, 0, 0
+
+    p50, p99 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+
+    return p50, p99, p99 - p50
+
+class LowJitterChain(object):
+    """
+    Runs a chain of tampers in low-jitter mode (for time-based techniques),
+    where tampers use bounded-time implementations (e.g. single pass of
+    randomcase, preallocated output buffers of charencode/chardoubleencode)
+    and next N payloads are tampered ahead of send time, leaving only a
+    dequeue on the request path
+
+    >>> chain = LowJitterChain(('space2comment',), depth=2)
+    >>> chain.refill(iter(('1 AND 1=1', '1 AND 1=2', '1 AND 1=3')))
+    2
+    >>> chain.next()
+    ('1/**/AND/**/1=1', {})
+    """
+
+    def __init__(self, tampers, depth=16, collect=True, samples=10000):
+        import collections
+
+        self.tampers = tuple(tampers)
+        self.depth = depth
+        self.collect = collect
+        self.pending = collections.deque()
+        self.tampering = collections.deque(maxlen=samples)
+        self.dequeueing = collections.deque(maxlen=samples)
+
+    def refill(self, payloads, **kwargs):
+        """
+        Tampers upcoming payloads (from a given iterator) until there are
+        depth of them pending (to be called outside of timing sensitive
+        part, e.g. after response has been received)
+        """
+
+        retVal = 0
+        kwargs["lowjitter"] = True
+
+        while len(self.pending) < self.depth:
+            try:
+                payload = next(payloads)
+            except StopIteration:
+                break
+
+            headers = dict(kwargs.get("headers") or {})
+            kwargs["headers"] = headers
+            start = _timer()
+            payload = tamperchain(payload, self.tampers, **kwargs)
+            self.tampering.append(_timer() - start)
+            self.pending.append((payload, headers))
+            retVal += 1
+
+        # garbage of the string churn gets collected here instead of on the request path
+        if retVal and self.collect:
+            import gc
+
+            gc.collect(0)
+
+        return retVal
+
+    def next(self):
+        """
+        Returns next pretampered (payload, headers)
+        """
+
+        start = _timer()
+        retVal = self.pending.popleft()
+        self.dequeueing.append(_timer() - start)
+
+        return retVal
+
+    def report(self):
+        """
+        Returns textual report of tampering and dequeueing latency spread
+        """
+
+        retVal = "%-12s %12s %12s %14s" % ("latency", "p50 (usec)", "p99 (usec)", "p99-p50 (usec)")
+
+        for name, latencies in (("tampering", self.tampering), ("dequeueing", self.dequeueing)):
+            retVal += "\n%-12s %12.2f %12.2f %14.2f" % ((name,) + tuple(1e6 * _ for _ in jitter(latencies)))
+
+        return retVal
+
+# Version of the serialized (compiled) chain format
+CHAIN_FORMAT_VERSION = 3
+
+def _sourcestamp(functions):
+    """
+    Returns cheap stamp (size and modification time) of source files of
+    given functions (None if not available)
+    """
+
+    import os
+
+    retVal = []
+
+    for filename in sorted(set(_.__code__.co_filename for _ in functions)):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        retVal.append((filename, stat.st_size, stat.st_mtime))
+
+    return tuple(retVal)
+
+class CompiledChain(object):
+    """
+    Chain of tampers with resolved stages, own keyword set (with keyword
+    rewrite tables built for it) and own RNG (if seeded), serializable into
+    a compact, versioned blob (stage names, their version hashes and source
+    stamp, keyword set, RNG seed and rewrite tables) for fast bootstrap of
+    worker processes. Keyword set and RNG state of the chain are swapped in
+    only for the duration of a call. With simplify=True dead, redundant and
+    absorbed stages get dropped (see simplifychain())
+
+    >>> chain = CompiledChain(('space2comment', 'appendnullbyte'))
+    >>> loadchain(chain.dumps())('1 AND 1=1')
+    '1/**/AND/**/1=1%00'
+    """
+
+    def __init__(self, tampers, seed=None, keywords=None, versions=None, simplify=False, stamp=None, tables=None):
+        self.names = tuple(_.__name__ for _ in simplifychain(tampers)) if simplify else tuple(getattr(_, "__name__", _) for _ in tampers)
+        self.functions = tuple(_gettamper(_) for _ in self.names)
+        self.seed = seed
+        self.random = random.Random(seed) if seed is not None else None
+        self.keywords = frozenset(kb.keywords if keywords is None else keywords)
+        self.versions = tuple(versions or (tamperversion(_) for _ in self.names))
+        self.stamp = stamp if versions else _sourcestamp(self.functions)
+
+        if tables is None:
+            templates = set(_ for name in self.names for _ in REWRITE_TEMPLATES.get(name, ()))
+            tables = [_RewriteTable(template, ignore, self.keywords) for template, ignore in sorted(templates)]
+
+        for table in tables:
+            table.keywords = self.keywords
+
+        self.tables = dict(((_.template, _.ignore, id(self.keywords)), _) for _ in tables)
+
+    def __call__(self, payload, **kwargs):
+        keywords = kb.keywords
+        kb.keywords = self.keywords
+        _rewritetables.update(self.tables)
+
+        if self.random is not None:
+            state = random.getstate()
+            random.setstate(self.random.getstate())
+
+        try:
+            return tamperchain(payload, self.functions, **kwargs)
+        finally:
+            if self.random is not None:
+                self.random.setstate(random.getstate())
+                random.setstate(state)
+
+            kb.keywords = keywords
+
+    def __reduce__(self):
+        return (loadchain, (self.dumps(),))
+
+    def predictlength(self, payload):
+        """
+        Returns bounds (minimum, maximum) of the output length for a given
+        payload (see predictchainlength())
+        """
+
+        return predictchainlength(self.functions, payload)
+
+    def dumps(self):
+        """
+        Returns serialized (blob) representation of the chain
+        """
+
+        import pickle
+
+        return pickle.dumps((CHAIN_FORMAT_VERSION, self.names, self.versions, self.stamp, self.keywords, self.seed, tuple(self.tables.values())), 2)
+
+def loadchain(blob, verify=True):
+    """
+    Returns compiled chain deserialized from a given blob, checking its
+    compatibility with the current format and tamper versions (version
+    hashes get recalculated only if source files of tampers differ from
+    the ones the chain has been compiled with)
+    """
+
+    import pickle
+
+    _ = pickle.loads(blob)
+
+    if _[0] != CHAIN_FORMAT_VERSION:
+        raise ValueError("unsupported chain format version (%s)" % _[0])
+
+    version, names, versions, stamp, keywords, seed, tables = _
+    retVal = CompiledChain(names, seed, keywords, versions, stamp=stamp, tables=tables)
+
+    if verify and (stamp is None or stamp != _sourcestamp(retVal.functions)):
+        for name, _ in zip(names, versions):
+            if tamperversion(name) != _:
+                raise ValueError("tamper '%s' has changed since the chain was compiled" % name)
+
+    return retVal
+
+def _commute(first, second):
+    """
+    Checks if two tampers (properties) can be swapped without changing
+    the output semantics
+    """
+
+    if first["headers"] or second["headers"]:
+        return first["deterministic"] or second["deterministic"]
+
+    if not (first["deterministic"] or second["deterministic"]):
+        return False
+
+    if first["anchor"] and first["anchor"] == second["anchor"]:
+        return False
+
+    for _, __ in ((first, second), (second, first)):
+        # appending of %XX sequences commutes with encoders leaving those intact
+        if _["keepsescapes"] and __["anchor"] == "end" and __["reads"] == "" and not (set(__["writes"]) - set("%" + string.hexdigits)):
+            return True
+
+    for _, __ in ((first, second), (second, first)):
+        if _["writes"] is None or __["reads"] is None or set(_["writes"]) & set(__["reads"]):
+            return False
+
+    if first["writes"] is None or second["writes"] is None or set(first["writes"]) & set(second["writes"]):
+        return False
+
+    return True
+
+def _tampercost(tamper):
+    """
+    Returns estimated cost (seconds per input byte) of a given tamper based
+    on collected statistics (None if not available)
+    """
+
+    stats = TAMPER_STATS.get(getattr(tamper, "__name__", tamper))
+
+    return stats[2] / stats[1] if stats and stats[1] else None
+
+def chaincost(tampers, length):
+    """
+    Returns estimated cost (in seconds) of running a payload of a given
+    length through a chain of tampers
+
+    >>> chaincost(('varnish',), 1000)
+    0.0
+    """
+
+    retVal = 0.0
+
+    for tamper in tampers:
+        properties = tamperproperties(tamper)
+
+        if not properties["headers"]:
+            cost = _tampercost(tamper)
+            retVal += (DEFAULT_BYTE_COST if cost is None else cost) * length
+            length *= properties["expansion"]
+
+    return retVal
+
+def planchain(tampers):
+    """
+    Reorders commuting stages of a tamper chain so cheap (size-preserving)
+    ones run before expensive (expanding) ones
+
+    >>> [_.__name__ for _ in planchain(('charencode', 'appendnullbyte', 'space2plus'))]
+    ['appendnullbyte', 'charencode', 'space2plus']
+    """
+
+    retVal = [_gettamper(_) for _ in tampers]
+    properties = [tamperproperties(_) for _ in retVal]
+    costs = [_tampercost(_) for _ in retVal]
+
+    if any(_ is None for _ in costs):
+        costs = [1.0] * len(retVal)
+
+    for _ in xrange(len(retVal) ** 2):
+        swapped = False
+
+        for i in xrange(len(retVal) - 1):
+            first, second = properties[i], properties[i + 1]
+
+            # exchange argument: cost of a stage is multiplied by the expansion of preceding ones
+            if costs[i + 1] + second["expansion"] * costs[i] < costs[i] + first["expansion"] * costs[i + 1] and _commute(first, second):
+                retVal[i], retVal[i + 1] = retVal[i + 1], retVal[i]
+                properties[i], properties[i + 1] = second, first
+                costs[i], costs[i + 1] = costs[i + 1], costs[i]
+                swapped = True
+
+        if not swapped:
+            break
+
+    return retVal
+
+def _redundancy(stages, properties):
+    """
+    Returns (index of a redundant stage, reason) for the last one of given
+    stages (None if there is none)
+    """
+
+    last, name = properties[-1], stages[-1].__name__
+
+    if last["headers"]:
+        return None
+
+    # stage gated by characters (or literals) which an earlier stage leaves none of
+    if last["chars"] is not None or last["literals"] is not None:
+        chars = set(last["chars"] or "".join(last["literals"] or ()))
+
+        for i in xrange(len(stages) - 2, -1, -1):
+            _ = properties[i]
+
+            if _["headers"]:
+                continue
+
+            if last["chars"] is not None and _["strips"] and chars <= set(_["strips"]):
+                return len(stages) - 1, "no-op after '%s'" % stages[i].__name__
+
+            if last["literals"] is not None and all(literal in (_["breaks"] or ()) or set(literal) & set(_["strips"] or "") for literal in last["literals"]):
+                return len(stages) - 1, "no-op after '%s'" % stages[i].__name__
+
+            # stages removing characters can make up new literals out of the remaining ones
+            if _["writes"] is None or set(_["writes"]) & chars or last["literals"] is not None and _["writes"]:
+                break
+
+    # repeated idempotent stage
+    if last["idempotent"] and last["deterministic"]:
+        for i in xrange(len(stages) - 2, -1, -1):
+            if stages[i] is stages[-1]:
+                return len(stages) - 1, "repeats idempotent '%s'" % name
+
+            if not _commute(properties[i], last):
+                break
+
+    # earlier stage setting case of keywords overridden by this one
+    if last["recases"]:
+        for i in xrange(len(stages) - 2, -1, -1):
+            _ = properties[i]
+
+            if _["recases"]:
+                return i, "absorbed by '%s'" % name
+
+            # stages reading or writing letters can depend on case or alter (boundaries of) keywords
+            if not _["headers"] and (_["reads"] is None or _["writes"] is None or any(char.isalpha() for char in _["reads"] + _["writes"])):
+                break
+
+    return None
+
+def simplifychain(tampers, warn=True):
+    """
+    Drops stages of a tamper chain which are known to be dead (no-op after
+    an earlier stage), redundant (repeated idempotent stage) or absorbed
+    (effect overridden by a later stage), based on tamper properties
+
+    >>> [_.__name__ for _ in simplifychain(('randomcase', 'lowercase', 'apostrophemask', 'space2comment', 'apostrophenullencode'), warn=False)]
+    ['lowercase', 'apostrophemask', 'space2comment']
+    >>> [_.__name__ for _ in simplifychain(('versionedkeywords', 'unionalltounion'), warn=False)]
+    ['versionedkeywords']
+    """
+
+    retVal, properties = [], []
+
+    for tamper in tampers:
+        retVal.append(_gettamper(tamper))
+        properties.append(tamperproperties(retVal[-1]))
+
+        while True:
+            redundancy = _redundancy(retVal, properties)
+
+            if redundancy is None:
+                break
+
+            index, reason = redundancy
+
+            if warn:
+                singleTimeWarnMessage("tamper '%s' has been dropped from the chain (%s)" % (retVal[index].__name__, reason))
+
+            del retVal[index], properties[index]
+
+            if index == len(retVal):
+                break
+
+    return retVal
+
+# Regular expressions used by the counting passes of length predictors
+ENCODED_REGEX = re.compile(r"%[0-9a-fA-F]{2}")
+WIDE_REGEX = re.compile(u"[^\x00-\xff]")
+NONALNUM_REGEX = re.compile(r"[^A-Za-z0-9]")
+NONALNUM_BYTES_REGEX = re.compile(b"[^A-Za-z0-9]")
+BLANK_REGEX = re.compile(r"\s")
+
+def _escapes(payload):
+    """
+    Returns number of already encoded (%XX) sequences in a given payload
+    """
+
+    return len((ENCODED_BYTES_REGEX if _isbytes(payload) else ENCODED_REGEX).findall(payload))
+
+def _widedigits(payload, width, mask=0):
+    """
+    Returns number of hex digits (over a given width) needed for encoding
+    of characters wider than a byte
+    """
+
+    if _isbytes(payload):
+        return 0
+
+    return sum(max(0, len("%X" % (mask | ord(_))) - width) for _ in WIDE_REGEX.findall(payload))
+
+def _blanks(payload):
+    """
+    Returns number of whitespaces in front of the trailing comment (as
+    replaced by space2dash, space2hash and space2mysqldash)
+    """
+
+    end = len(payload)
+
+    for _ in ('#', "-- "):
+        index = payload.find(_)
+        if index != -1:
+            end = min(end, index)
+
+    return len(BLANK_REGEX.findall(payload, 0, end))
+
+def _unquotedspaces(payload):
+    """
+    Returns bounds for number of spaces replaced by quote-aware space2*
+    tampers (exact when there are no quotes after the first whitespace)
+    """
+
+    match = BLANK_REGEX.search(payload)
+
+    if not match:
+        return 0, 0
+
+    spaces = 1 + payload.count(' ', match.end())
+
+    if payload.find('\'', match.end()) == -1 and payload.find('"', match.end()) == -1:
+        return spaces, spaces
+    else:
+        return 1, spaces
+
+def _keywords(payload, regex, ignore=()):
+    """
+    Returns number of keywords matched by a given regex, together with
+    positions of spaces in front of and behind them
+    """
+
+    retVal, before, after = 0, set(), set()
+
+    for match in regex.finditer(payload):
+        word = match.group("word").upper()
+
+        if word in kb.keywords and word not in ignore:
+            retVal += 1
+
+            if payload[match.start() - 1] == ' ':
+                before.add(match.start() - 1)
+
+            if payload[match.end():match.end() + 1] == ' ':
+                after.add(match.end())
+
+    return retVal, before, after
+
+def _versioned(payload, regex, ignore=(), half=False):
+    """
+    Returns output length of versioned comment tampers, where spaces around
+    the '/*!...*/' (or in front of the half-versioned '/*!0') are squeezed out
+    """
+
+    count, before, after = _keywords(payload, regex, ignore)
+
+    if half:
+        retVal = len(payload) + 4 * count - len(before)
+        squeezable = payload.count(" /*!0")
+    else:
+        retVal = len(payload) + 5 * count - len(before | after)
+        squeezable = payload.count(" /*!") + payload.count("*/ ")
+
+    # squeezing applies to already present comments too
+    return (retVal - squeezable, retVal) if squeezable else retVal
+
+def _morehash(payload):
+    """
+    Returns output length bounds of space2morehash, where each keyword gets
+    '%23' followed by 6-12 random letters and '%0A' appended and each
+    whitespace gets replaced with the same
+    """
+
+    keywords, blanks = _keywords(payload, KEYWORD_REGEX, IGNORE_SPACE_AFFECTED_KEYWORDS)[0], _blanks(payload)
+
+    return len(payload) + 12 * keywords + 11 * blanks, len(payload) + 18 * keywords + 17 * blanks
+
+def _modsecurity(payload):
+    """
+    Returns output length of modsecurity(zero)versioned tampers
+    """
+
+    head = payload
+
+    for comment in ('#', '--', '/*'):
+        if comment in payload:
+            head = payload[:payload.find(comment)]
+            break
+
+    return len(payload) + (10 if ' ' in head else 0)
+
+def _bounds(tamper, length):
+    """
+    Returns length bounds for a payload of a given length derived solely
+    from the tamper properties (None for unknown upper bound)
+    """
+
+    properties = tamperproperties(tamper)
+
+    if properties["headers"]:
+        return length, length
+    elif properties["unbounded"]:
+        return 0 if properties["shrinks"] else length, None
+    else:
+        return 0 if properties["shrinks"] else length, int(length * properties["expansion"] + 0.999999) + properties["overhead"]
+
+# Counting passes returning exact output length (int) or its bounds (tuple) without building the output
+LENGTH_PREDICTORS = {
+    "apostrophemask": lambda payload: len(payload) + 8 * payload.count(b"'" if _isbytes(payload) else '\''),
+    "apostrophenullencode": lambda payload: len(payload) + 5 * payload.count('\''),
+    "appendnullbyte": lambda payload: len(payload) + 3,
+    "base64encode": lambda payload: 4 * ((len(payload if _isbytes(payload) else payload.encode(UNICODE_ENCODING)) + 2) // 3),
+    "chardoubleencode": lambda payload: 5 * (len(payload) - 2 * _escapes(payload)) + _widedigits(payload, 2),
+    "charencode": lambda payload: 3 * (len(payload) - 2 * _escapes(payload)) + _widedigits(payload, 2),
+    "charunicodeencode": lambda payload: 6 * (len(payload) - 2 * _escapes(payload)) + _widedigits(payload, 4),
+    "concat2concatws": lambda payload: len(payload) + 20 * payload.count("CONCAT("),
+    "equaltolike": lambda payload: len(payload) + sum(4 + (_.group()[0] != ' ') + (_.group()[-1] != ' ') - len(_.group()) for _ in _guard(EQUALS_REGEX, payload).finditer(payload)),
+    "halfversionedmorekeywords": lambda payload: _versioned(payload, KEYWORD_REGEX, IGNORE_SPACE_AFFECTED_KEYWORDS, half=True),
+    "informationschemacomment": lambda payload: len(payload) + 4 * len(re.findall(r"(?i)information_schema\.", payload)),
+    "lowercase": len,
+    "modsecurityversioned": _modsecurity,
+    "modsecurityzeroversioned": _modsecurity,
+    "nonrecursivereplacement": lambda payload: len(payload) + sum(len(_) * len(re.findall(r"(?i)\b%s\b" % _, payload)) for _ in NONRECURSIVE_KEYWORDS),
+    "overlongutf8": lambda payload: len(payload) + 5 * (len((NONALNUM_BYTES_REGEX if _isbytes(payload) else NONALNUM_REGEX).findall(payload)) - _escapes(payload)) + _widedigits(payload, 2, 0x8A),
+    "percentage": lambda payload: 2 * len(payload) - 3 * _escapes(payload) - payload.count(b" " if _isbytes(payload) else ' '),
+    "randomcase": len,
+    "securesphere": lambda payload: len(payload) + 24,
+    "space2comment": lambda payload: tuple(len(payload) + 3 * _ for _ in _unquotedspaces(payload)),
+    "space2dash": lambda payload: (len(payload) + 10 * _blanks(payload), len(payload) + 16 * _blanks(payload)),
+    "space2hash": lambda payload: (len(payload) + 11 * _blanks(payload), len(payload) + 17 * _blanks(payload)),
+    "space2morehash": _morehash,
+    "space2mssqlblank": lambda payload: tuple(len(payload) + 2 * _ for _ in _unquotedspaces(payload)),
+    "space2mysqldash": lambda payload: len(payload) + 4 * _blanks(payload),
+    "space2plus": len,
+    "space2randomblank": lambda payload: tuple(len(payload) + 2 * _ for _ in _unquotedspaces(payload)),
+    "sp_password": lambda payload: len(payload) + (11 if any(_ in payload for _ in ('#', "-- ")) else 14),
+    "symboliclogical": lambda payload: len(payload) + 3 * len(re.findall(r"(?i)\bAND\b", payload)) + 4 * len(re.findall(r"(?i)\bOR\b", payload)),
+    "unionalltounion": lambda payload: len(payload) - 4 * payload.count("UNION ALL SELECT"),
+    "versionedkeywords": lambda payload: _versioned(payload, NONFUNCTION_KEYWORD_REGEX),
+    "versionedmorekeywords": lambda payload: _versioned(payload, KEYWORD_REGEX, IGNORE_SPACE_AFFECTED_KEYWORDS),
+}
+
+def predictlength(tamper, payload):
+    """
+    Returns bounds (minimum, maximum) of the output length of a given
+    tamper for a given payload, calculated with a cheap counting pass
+    (equal bounds for exact prediction; maximum is None if unbounded)
+
+    >>> predictlength('chardoubleencode', 'SELECT%20A')
+    (40, 40)
+    >>> predictlength('space2hash', '1 AND 2>1')
+    (31, 43)
+    """
+
+    name = getattr(tamper, "__name__", tamper)
+
+    if not payload:
+        return (0, 0) if name in ("space2dash", "space2hash", "space2morehash", "space2mysqldash", "sp_password") else (len(payload), len(payload))
+
+    properties = tamperproperties(name)
+
+    if properties["chars"] and not any(_ in payload for _ in properties["chars"]):
+        return len(payload), len(payload)
+
+    predictor = LENGTH_PREDICTORS.get(name)
+    retVal = predictor(payload) if predictor else _bounds(name, len(payload))
+
+    return (retVal, retVal) if isinstance(retVal, int) else tuple(retVal)
+
+def predictchainlength(tampers, payload):
+    """
+    Returns bounds (minimum, maximum) of the output length of a given chain
+    of tampers for a given payload, where the first payload altering stage
+    is predicted by counting and the rest by their tamper properties
+
+    >>> predictchainlength(('space2comment', 'charencode'), '1 AND 1=1')
+    (15, 45)
+    """
+
+    retVal = None
+
+    # expansion ratios hold for ASCII only, so extra (UTF-8) bytes of non-ASCII characters are accounted separately
+    extra = 0 if _isbytes(payload) else len(payload.encode(UNICODE_ENCODING)) - len(payload)
+
+    for tamper in tampers:
+        if tamperproperties(tamper)["headers"]:
+            continue
+
+        if retVal is None:
+            retVal = predictlength(tamper, payload)
+        else:
+            minimum = _bounds(tamper, retVal[0])[0]
+            maximum = _bounds(tamper, retVal[1])[1] if retVal[1] is not None else None
+            retVal = minimum, maximum + int(extra * tamperproperties(tamper)["expansion"] + 0.999999) if maximum is not None else None
+
+    return retVal or (len(payload), len(payload))
+
+def fitchain(chains, payload, limit):
+    """
+    Returns the first of given chains (in order of preference) whose output
+    for a given payload is guaranteed not to exceed a given length limit
+    (None if there is no such chain)
+
+    >>> fitchain((('chardoubleencode',), ('space2comment',)), '1 AND 1=1', 20)
+    ('space2comment',)
+    """
+
+    for chain in chains:
+        maximum = (chain.predictlength(payload) if isinstance(chain, CompiledChain) else predictchainlength(chain, payload))[1]
+
+        if maximum is not None and maximum <= limit:
+            return chain
+
+    return None
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+"""
+Producer/consumer prefetch pipeline tampering ahead of the HTTP sender
+
+A background thread pulls payloads from a lazy stream of upcoming ones
+(e.g. next bisection steps of blind extraction), runs them through a chain
+of tampers and puts them into a bounded queue (lookahead depth), so the
+sender only dequeues finished payloads. Switching to a different stream
+(extraction branch change) cancels everything tampered ahead for the old
+one. Queue depth seen by the sender and the time it stalled on an empty
+queue are collected as metrics
+"""
+
+import collections
+import optparse
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from mytemper import _timer
+from mytemper import jitter
+from mytemper import tamperchain
+
+# Default lookahead depth (maximum number of payloads tampered ahead)
+DEFAULT_DEPTH = 16
+
+# Dequeue wait (in seconds) above which the sender is considered stalled
+STALL_THRESHOLD = 1e-4
+
+# Marker of the end of payload stream
+_END = object()
+
+class PrefetchChain(object):
+    """
+    Tampers payloads of a given stream ahead (to be used as iterator, with
+    next(), or with get() and branch())
+
+    >>> with PrefetchChain(('space2comment',), ('1 AND 1=1', '1 AND 1=2'), depth=2) as chain:
+    ...     list(chain)
+    [('1/**/AND/**/1=1', {}), ('1/**/AND/**/1=2', {})]
+    """
+
+    def __init__(self, tampers, payloads=None, depth=DEFAULT_DEPTH, samples=10000, **kwargs):
+        self.tampers = tuple(tampers)
+        self.depth = depth
+        self.kwargs = kwargs
+        self.cancelled = 0
+        self.depths = collections.deque(maxlen=samples)
+        self.stalls = collections.deque(maxlen=samples)
+        self._queue = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._generation = 0
+        self._payloads = None
+        self._stopped = False
+        self._thread = None
+
+        if payloads is not None:
+            self.branch(payloads)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.get()
+
+    next = __next__
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self._drain()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _drain(self):
+        """
+        Drops everything tampered ahead (returning the number of dropped payloads)
+        """
+
+        retVal = 0
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            retVal += item[1] is not _END
+
+        return retVal
+
+    def _run(self):
+        while not self._stopped:
+            with self._lock:
+                generation, payloads = self._generation, self._payloads
+                self._wake.clear()
+
+            if payloads is None:
+                self._wake.wait()
+                continue
+
+            try:
+                payload = next(payloads)
+            except Exception as ex:
+                # exhausted (or failed) stream
+                with self._lock:
+                    if generation == self._generation:
+                        self._payloads = None
+
+                self._queue.put((generation, _END if isinstance(ex, StopIteration) else ex, None))
+                continue
+
+            headers = dict(self.kwargs.get("headers") or {})
+            kwargs = dict(self.kwargs, headers=headers)
+
+            try:
+                item = (generation, tamperchain(payload, self.tampers, **kwargs), headers)
+            except Exception as ex:
+                item = (generation, ex, None)
+
+            # blocks while the queue is full (stale items get dropped by the consumer)
+            self._queue.put(item)
+
+    def branch(self, payloads):
+        """
+        Switches to a given stream of payloads (e.g. after the extraction
+        branch has changed), cancelling payloads tampered ahead for the
+        previous one
+        """
+
+        with self._lock:
+            self._generation += 1
+            self._payloads = iter(payloads)
+            self.cancelled += self._drain()
+            self._wake.set()
+
+    def get(self, timeout=None):
+        """
+        Returns next tampered (payload, headers), raising StopIteration at
+        the end of the current stream
+        """
+
+        start = _timer()
+        self.depths.append(self._queue.qsize())
+
+        while True:
+            generation, payload, headers = self._queue.get(timeout=timeout)
+
+            if generation != self._generation:
+                self.cancelled += payload is not _END
+                continue
+
+            break
+
+        self.stalls.append(_timer() - start)
+
+        if payload is _END:
+            raise StopIteration
+
+        if isinstance(payload, Exception):
+            raise payload
+
+        return payload, headers
+
+    def report(self):
+        """
+        Returns textual report of queue depth and sender stall time
+        """
+
+        retVal = "%-12s %10s %10s %10s" % ("metric", "p50", "p99", "max")
+        retVal += "\n%-12s %10d %10d %10d" % ("depth", jitter(self.depths)[0], jitter(self.depths)[1], max(self.depths or (0,)))
+        retVal += "\n%-12s %10.1f %10.1f %10.1f" % ("stall (usec)", 1e6 * jitter(self.stalls)[0], 1e6 * jitter(self.stalls)[1], 1e6 * max(self.stalls or (0,)))
+        retVal += "\nstalled dequeues: %d/%d (%.1f ms in total), cancelled payloads: %d" % (sum(1 for _ in self.stalls if _ > STALL_THRESHOLD), len(self.stalls), 1e3 * sum(_ for _ in self.stalls if _ > STALL_THRESHOLD), self.cancelled)
+
+        return retVal
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] payload")
+    parser.add_option("--tamper", default="space2comment,charencode", help="Comma separated chain of tampers (default space2comment,charencode)")
+    parser.add_option("--depth", type="int", default=DEFAULT_DEPTH, help="Lookahead depth (default %d)" % DEFAULT_DEPTH)
+    parser.add_option("--count", type="int", default=1000, help="Number of simulated requests (default 1000)")
+    parser.add_option("--latency", type="float", default=0.002, help="Simulated request latency in seconds (default 0.002)")
+    parser.add_option("--branch", type="int", default=64, help="Branch change every N requests (default 64)")
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("missing payload")
+
+    def payloads(branch):
+        for i in range(options.count):
+            yield "%s AND ORD(MID(x,%d,1))>%d" % (args[0], branch, i)
+
+    tampers = options.tamper.split(',')
+    inline = 0.0
+
+    for i in range(options.count):
+        start = _timer()
+        tamperchain("%s AND ORD(MID(x,%d,1))>%d" % (args[0], i // options.branch, i), tampers)
+        inline += _timer() - start
+        time.sleep(options.latency)
+
+    with PrefetchChain(tampers, payloads(0), options.depth) as chain:
+        for i in range(options.count):
+            if i and i % options.branch == 0:
+                chain.branch(payloads(i // options.branch))
+
+            chain.get()
+            time.sleep(options.latency)
+
+    print(chain.report())
+    print("request path: %.1f usec/request inline, %.1f usec/request prefetched" % (1e6 * inline / options.count, 1e6 * sum(chain.stalls) / options.count))
+
+if __name__ == "__main__":
+    main()
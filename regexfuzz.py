@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Regular expression complexity fuzzer of tampers
+
+Each tamper is run over families of crafted inputs (whitespace runs,
+repeated AND/OR clauses, unterminated quotes and parentheses, long words,
+many lines, etc.) of growing size, aimed at backtracking of patterns used
+by tampers (e.g. the (?!.*\\b(AND|OR)\\b) lookahead of between/greatest or
+the leading \\s* of equaltolike and unmagicquotes). Growth exponent of
+runtime (runtime ~ size ** exponent) between the smallest and the largest
+size is reported per tamper and family, failing on super-linear scaling
+not listed as a known (accepted) one
+"""
+
+import math
+import optparse
+import sys
+
+import mytemper
+
+from mytemper import _gettamper
+from mytemper import _timer
+from mytemper import tamperproperties
+
+# Payload sizes (in characters) of the default sweep
+DEFAULT_SIZES = (4096, 8192, 16384, 32768)
+
+# Growth exponent above which a tamper gets flagged
+SUPERLINEAR_EXPONENT = 1.5
+
+# Runtime (in seconds, at the largest size) below which growth exponent is not calculated (noise)
+NOISE_FLOOR = 1e-3
+
+# Number of runs per measurement (the fastest one is taken)
+REPEAT = 3
+
+def _fill(head, fragment, tail, size):
+    return head + fragment * max(1, (size - len(head) - len(tail)) // len(fragment)) + tail
+
+# Families with many occurrences of (the same) keywords
+KEYWORD_FAMILIES = ("clauses", "clauses-eq", "keywords", "lines")
+
+# Known (accepted) super-linear scaling: tamper -> (families, reason)
+ACCEPTED_SUPERLINEAR = {
+    "randomcase": (KEYWORD_FAMILIES, "each keyword occurrence draws a new case mask and replaces all occurrences of its spelling, so seeded outputs depend on one whole payload str.replace() per occurrence"),
+    "randomcomments": (KEYWORD_FAMILIES, "each keyword occurrence draws new comment gaps and replaces all occurrences of its spelling, so seeded outputs depend on one whole payload str.replace() per occurrence"),
+}
+
+# Crafted input families (functions returning payload of a given size)
+FAMILIES = {
+    "spaces": lambda size: _fill("1", " ", "x", size),
+    "blanks": lambda size: _fill("1 AND 1", " \t\r\n", "2", size),
+    "spaces-quote": lambda size: _fill("1' ", " ", "AND 1", size),
+    "spaces-gt": lambda size: _fill("1 AND 1", " ", "2>", size),
+    "clauses": lambda size: _fill("1", " AND 1", ">0", size),
+    "clauses-eq": lambda size: _fill("1", " OR a", "=b", size),
+    "lines": lambda size: _fill("1", " AND\n", "1>0", size),
+    "parens": lambda size: _fill("1' AND ", "(", "", size),
+    "equals": lambda size: _fill("1' AND a", "=", "b", size),
+    "word": lambda size: _fill("1 AND ", "a", ">", size),
+    "keywords": lambda size: _fill("1", " UNION SELECT", " NULL", size),
+    "quotes": lambda size: _fill("1", " 'a", "", size),
+}
+
+def _runtime(function, payload):
+    retVal = None
+
+    for _ in range(REPEAT):
+        start = _timer()
+        function(payload, headers={})
+        elapsed = _timer() - start
+        retVal = elapsed if retVal is None else min(retVal, elapsed)
+
+    return retVal
+
+def _accepted(name, family):
+    return family in ACCEPTED_SUPERLINEAR.get(name, ((), None))[0]
+
+def fuzz(tampers=None, families=None, sizes=DEFAULT_SIZES):
+    """
+    Returns records (tamper, family, runtimes per size, growth exponent,
+    super-linear flag, accepted flag)
+    """
+
+    retVal = []
+
+    for name in sorted(tampers or (_ for _ in mytemper.TAMPER_PROPERTIES if not tamperproperties(_)["headers"])):
+        function = _gettamper(name)
+
+        for family in sorted(families or FAMILIES):
+            runtimes = [_runtime(function, FAMILIES[family](size)) for size in sizes]
+            exponent = math.log(runtimes[-1] / max(runtimes[0], 1e-9)) / math.log(1.0 * sizes[-1] / sizes[0]) if runtimes[-1] >= NOISE_FLOOR else None
+            retVal.append(dict(tamper=name, family=family, runtimes=runtimes, exponent=exponent, superlinear=(exponent or 0) > SUPERLINEAR_EXPONENT, accepted=_accepted(name, family)))
+
+    return retVal
+
+def table(records, sizes=DEFAULT_SIZES):
+    """
+    Returns fuzzing records formatted as a text table
+    """
+
+    retVal = "%-26s %-13s %s %9s" % ("tamper", "family", " ".join("%10s" % ("%d (ms)" % _) for _ in sizes), "exponent")
+
+    for record in records:
+        retVal += "\n%-26s %-13s %s %9s %s" % (record["tamper"], record["family"], " ".join("%10.2f" % (1e3 * _) for _ in record["runtimes"]), '-' if record["exponent"] is None else "%.2f" % record["exponent"], ("SUPERLINEAR (accepted)" if record["accepted"] else "SUPERLINEAR") if record["superlinear"] else "")
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--tamper", help="Comma separated tampers to fuzz (default all)")
+    parser.add_option("--family", help="Comma separated input families (default all: %s)" % ",".join(sorted(FAMILIES)))
+    parser.add_option("--sizes", default=",".join(str(_) for _ in DEFAULT_SIZES), help="Payload sizes of the sweep (default %s)" % ",".join(str(_) for _ in DEFAULT_SIZES))
+    parser.add_option("--unguarded", action="store_true", help="Disable linear fallbacks of guarded regular expressions")
+    parser.add_option("--strict", action="store_true", help="Fail on known (accepted) super-linear scaling too")
+    options, _ = parser.parse_args()
+
+    if options.unguarded:
+        mytemper.LINEAR_FALLBACK_THRESHOLD = sys.maxsize
+
+    sizes = tuple(int(_) for _ in options.sizes.split(','))
+    records = fuzz(options.tamper.split(',') if options.tamper else None, options.family.split(',') if options.family else None, sizes)
+
+    print(table(records, sizes))
+
+    flagged = sorted(set("%s (%s)" % (_["tamper"], _["family"]) for _ in records if _["superlinear"] and (options.strict or not _["accepted"])))
+
+    if flagged:
+        sys.stderr.write("super-linear runtime growth: %s\n" % ", ".join(flagged))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
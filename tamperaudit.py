@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""
+Allocation and GC-pressure audit of tampers
+
+Each tamper is run over a sweep of payload sizes under tracemalloc (peak
+of traced memory) and with gc callbacks installed (collections triggered
+per generation). Allocations are counted as increments of allocated memory
+blocks (sys.getallocatedblocks()) between consecutive opcodes of a traced
+run, so short-lived temporaries (e.g. per-character string concatenation)
+are counted too. Growth exponents between the two largest sizes (where
+per-call constants and cached small integers do not skew them anymore)
+flag tampers with super-linear allocation behavior. Results are
+written as a text or CSV table (with tamper version hashes), meant to be
+kept and compared over releases
+"""
+
+import gc
+import math
+import optparse
+import sys
+
+import mytemper
+
+from mytemper import _gettamper
+from mytemper import tamperproperties
+from mytemper import tamperversion
+
+# Payload sizes (in characters) of the default sweep
+DEFAULT_SIZES = (128, 512, 2048, 8192)
+
+# Fragment repeated up to the requested payload size (no comment marks, so no tamper stops early)
+AUDIT_FRAGMENT = "1 AND 'a b'=CONCAT(CHAR(58),IFNULL(CAST(x AS CHAR),CHAR(32))) OR 2>1 UNION ALL SELECT NULL,information_schema.tables "
+
+# Growth exponent (metric ~ size ** exponent) above which a tamper gets flagged
+SUPERLINEAR_EXPONENT = 1.2
+
+# Metric values (at the largest size) below which growth exponent is not calculated (noise)
+NOISE_FLOOR = 64
+
+def _payload(size):
+    return (AUDIT_FRAGMENT * (size // len(AUDIT_FRAGMENT) + 1))[:size]
+
+def _allocations(function, payload):
+    """
+    Returns number of memory blocks allocated by a single call of a given
+    function (sum of increments of allocated blocks between consecutive
+    traced opcodes)
+    """
+
+    state = [0, None]   # allocations, allocated blocks at the previous event
+
+    def tracer(frame, event, arg):
+        blocks = sys.getallocatedblocks()
+
+        if state[1] is not None and blocks > state[1]:
+            state[0] += blocks - state[1]
+
+        state[1] = blocks
+        frame.f_trace_opcodes = True
+
+        return tracer
+
+    sys.settrace(tracer)
+
+    try:
+        function(payload, headers={})
+    finally:
+        sys.settrace(None)
+
+    return state[0]
+
+def measure(tamper, payload):
+    """
+    Returns (allocated memory blocks, peak traced bytes, collections per
+    generation) of a single tamper call
+    """
+
+    import tracemalloc
+
+    function = _gettamper(tamper)
+    collections = [0] * len(gc.get_count())
+    allocations = _allocations(function, payload)
+
+    def callback(phase, info):
+        if phase == "start":
+            collections[info["generation"]] += 1
+
+    gc.collect()
+    gc.callbacks.append(callback)
+    tracemalloc.start()
+
+    try:
+        function(payload, headers={})
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        gc.callbacks.remove(callback)
+
+    return allocations, peak, collections
+
+def _exponent(sizes, values):
+    if values[-1] < NOISE_FLOOR:
+        return None
+
+    return math.log(1.0 * values[-1] / max(1, values[-2])) / math.log(1.0 * sizes[-1] / sizes[-2])
+
+def audit(tampers=None, sizes=DEFAULT_SIZES):
+    """
+    Returns audit records (one per tamper and size) together with growth
+    exponents and super-linear flags of allocations and peak bytes
+    """
+
+    retVal = []
+
+    for name in sorted(tampers or (_ for _ in mytemper.TAMPER_PROPERTIES if not tamperproperties(_)["headers"])):
+        records = []
+
+        for size in sizes:
+            allocations, peak, collections = measure(name, _payload(size))
+            records.append(dict(tamper=name, version=tamperversion(name)[:8], size=size, allocations=allocations, peak=peak, collections=collections))
+
+        for key in ("allocations", "peak"):
+            exponent = _exponent(sizes, [_[key] for _ in records])
+
+            for record in records:
+                record["%s_exponent" % key] = exponent
+
+        for record in records:
+            record["superlinear"] = any((_ or 0) > SUPERLINEAR_EXPONENT for _ in (record["allocations_exponent"], record["peak_exponent"]))
+
+        retVal.extend(records)
+
+    return retVal
+
+def _format(exponent):
+    return '-' if exponent is None else "%.2f" % exponent
+
+def table(records, csv=False):
+    """
+    Returns audit records formatted as a text (or CSV) table
+    """
+
+    columns = ("tamper", "version", "size", "allocs/byte", "peak/byte", "gc0/gc1/gc2", "allocs exp", "peak exp", "flag")
+    rows = []
+
+    for record in records:
+        rows.append((record["tamper"], record["version"], "%d" % record["size"], "%.3f" % (1.0 * record["allocations"] / record["size"]), "%.2f" % (1.0 * record["peak"] / record["size"]), "/".join(str(_) for _ in record["collections"]), _format(record["allocations_exponent"]), _format(record["peak_exponent"]), "SUPERLINEAR" if record["superlinear"] else ""))
+
+    if csv:
+        return "\n".join(",".join(_) for _ in (columns,) + tuple(rows))
+    else:
+        return "\n".join("%-26s %-8s %6s %11s %9s %11s %10s %8s %s" % _ for _ in (columns,) + tuple(rows))
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--tamper", help="Comma separated tampers to audit (default all)")
+    parser.add_option("--sizes", default=",".join(str(_) for _ in DEFAULT_SIZES), help="Payload sizes of the sweep (default %s)" % ",".join(str(_) for _ in DEFAULT_SIZES))
+    parser.add_option("--csv", action="store_true", help="Output table in CSV format")
+    parser.add_option("--output", help="Write table to a given file instead of standard output")
+    options, _ = parser.parse_args()
+
+    try:
+        import tracemalloc
+    except ImportError:
+        parser.error("tracemalloc is not available (Python 3.4 or newer is required)")
+
+    records = audit(options.tamper.split(',') if options.tamper else None, tuple(int(_) for _ in options.sizes.split(',')))
+    result = table(records, options.csv)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write("%s\n" % result)
+    else:
+        print(result)
+
+    flagged = sorted(set(_["tamper"] for _ in records if _["superlinear"]))
+
+    if flagged:
+        sys.stderr.write("super-linear allocation growth: %s\n" % ", ".join(flagged))
+
+if __name__ == "__main__":
+    main()
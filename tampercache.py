@@ -0,0 +1,248 @@
+"""
+Persistent (on-disk) cache of deterministic tamper chain results
+
+Results are appended to a data file, while a fixed-size open addressing
+hash table (memory-mapped index file) maps keys to data file offsets, so
+lookups do not load the whole cache. Keys combine chain signature, version
+hashes of used tampers (hence entries get invalidated automatically when a
+tamper changes), keyword arguments, active keyword set and payload. Data
+is flushed before its index slot gets written and slots carry length and
+checksum of their data (truncated or corrupted records are misses), while
+files are locked (where supported) as they can be shared by processes.
+Size-based eviction keeps two generations of files, dropping the older one
+once the current one gets full
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import mytemper
+
+from mytemper import tamperchain
+from mytemper import tamperproperties
+from mytemper import tamperversion
+
+# Default maximum size (in bytes) of data stored in a single cache generation
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Default number of index slots in a single cache generation
+DEFAULT_CACHE_SLOTS = 1 << 16
+
+# Maximum ratio of used index slots (before generation gets rotated)
+MAX_CACHE_LOAD = 0.7
+
+# Index slot (key digest, data offset, data length, data checksum)
+SLOT_FORMAT = struct.Struct("<16sQII")
+
+# Empty (unused) index slot key
+EMPTY_KEY = b"\0" * 16
+
+# Value types stored in front of cached data
+STR_TYPE, BYTES_TYPE = b"s", b"b"
+
+class _Generation(object):
+    """
+    Single generation of cache files (data and memory-mapped index)
+    """
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+
+        exists = os.path.exists(path + ".index") and os.path.getsize(path + ".index") == slots * SLOT_FORMAT.size
+
+        with open(path + ".index", "r+b" if exists else "w+b") as f:
+            if not exists:
+                f.truncate(slots * SLOT_FORMAT.size)
+            self.index = mmap.mmap(f.fileno(), 0)
+
+        if not exists and os.path.exists(path + ".data"):
+            os.remove(path + ".data")
+
+        self.data = open(path + ".data", "a+b")
+        self.data.seek(0, os.SEEK_END)
+        self.size = self.data.tell()
+        self.used = sum(1 for i in range(slots) if self.index[i * SLOT_FORMAT.size:i * SLOT_FORMAT.size + 16] != EMPTY_KEY) if exists else 0
+
+    def _find(self, key):
+        """
+        Returns slot number of a given key (or of the empty slot where it should go)
+        """
+
+        slot = struct.unpack("<Q", key[:8])[0] % self.slots
+
+        while True:
+            _ = self.index[slot * SLOT_FORMAT.size:slot * SLOT_FORMAT.size + 16]
+
+            if _ == key or _ == EMPTY_KEY:
+                return slot
+
+            slot = (slot + 1) % self.slots
+
+    def _lock(self, exclusive=False):
+        if fcntl:
+            fcntl.flock(self.data.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _unlock(self):
+        if fcntl:
+            fcntl.flock(self.data.fileno(), fcntl.LOCK_UN)
+
+    def get(self, key):
+        self._lock()
+
+        try:
+            slot = self._find(key)
+            _, offset, length, checksum = SLOT_FORMAT.unpack_from(self.index, slot * SLOT_FORMAT.size)
+
+            if _ == key:
+                self.data.seek(offset)
+                retVal = self.data.read(length)
+
+                # truncated (e.g. killed writer) or corrupted records are misses
+                if len(retVal) == length and zlib.crc32(retVal) & 0xffffffff == checksum:
+                    return retVal
+        finally:
+            self._unlock()
+
+    def put(self, key, value):
+        self._lock(True)
+
+        try:
+            slot = self._find(key)
+            self.data.seek(0, os.SEEK_END)
+            offset = self.data.tell()
+            self.data.write(value)
+            self.data.flush()
+            SLOT_FORMAT.pack_into(self.index, slot * SLOT_FORMAT.size, key, offset, len(value), zlib.crc32(value) & 0xffffffff)
+            self.size = offset + len(value)
+            self.used += 1
+        finally:
+            self._unlock()
+
+    def full(self, maxsize):
+        return self.size >= maxsize or self.used >= self.slots * MAX_CACHE_LOAD
+
+    def close(self, remove=False):
+        self.index.close()
+        self.data.close()
+
+        if remove:
+            for _ in (".index", ".data"):
+                os.remove(self.path + _)
+
+class TamperCache(object):
+    """
+    Persistent cache of (deterministic) tamper chain results
+    """
+
+    def __init__(self, directory, maxsize=DEFAULT_CACHE_SIZE, slots=DEFAULT_CACHE_SLOTS):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.slots = slots
+        self.hits = self.misses = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.current = _Generation(os.path.join(directory, "current"), slots)
+        self.previous = _Generation(os.path.join(directory, "previous"), slots) if os.path.exists(os.path.join(directory, "previous.index")) else None
+        self._signatures = {}
+        self._keywords = (None, 0, None)
+
+    def _signature(self, tampers):
+        """
+        Returns chain signature (including versions of used tampers)
+        """
+
+        tampers = tuple(getattr(_, "__name__", _) for _ in tampers)
+
+        if tampers not in self._signatures:
+            self._signatures[tampers] = hashlib.md5(";".join("%s:%s" % (_, tamperversion(_)) for _ in tampers).encode("utf8")).digest()
+
+        return self._signatures[tampers]
+
+    def _keywordsdigest(self):
+        """
+        Returns digest of the active keyword set (kb.keywords), recalculated
+        whenever it gets replaced or changes its size
+        """
+
+        keywords = mytemper.kb.keywords
+
+        if self._keywords[0] is not keywords or self._keywords[1] != len(keywords):
+            self._keywords = (keywords, len(keywords), hashlib.md5(";".join(sorted(keywords)).encode("utf8")).digest())
+
+        return self._keywords[2]
+
+    def _rotate(self):
+        if self.previous:
+            self.previous.close(remove=True)
+
+        self.current.close()
+
+        for _ in (".index", ".data"):
+            os.rename(os.path.join(self.directory, "current" + _), os.path.join(self.directory, "previous" + _))
+
+        self.previous = _Generation(os.path.join(self.directory, "previous"), self.slots)
+        self.current = _Generation(os.path.join(self.directory, "current"), self.slots)
+
+    def _put(self, key, value):
+        if self.current.full(self.maxsize):
+            self._rotate()
+
+        self.current.put(key, value)
+
+    def tamper(self, payload, tampers, **kwargs):
+        """
+        Returns payload run through a chain of tampers, using cached result
+        if the chain is deterministic
+        """
+
+        properties = [tamperproperties(_) for _ in tampers]
+
+        if not payload or not all(_["deterministic"] for _ in properties):
+            return tamperchain(payload, tampers, **kwargs)
+
+        # header-only tampers have side effects hence are always run
+        tamperchain(payload, [_ for _, __ in zip(tampers, properties) if __["headers"]], **kwargs)
+        tampers = [_ for _, __ in zip(tampers, properties) if not __["headers"]]
+
+        isbytes = isinstance(payload, (bytes, bytearray))
+        # headers are an output argument (filled by tampers)
+        options = repr(sorted((_, kwargs[_]) for _ in kwargs if _ != "headers")).encode("utf8")
+        key = hashlib.md5(self._signature(tampers) + self._keywordsdigest() + options + (BYTES_TYPE if isbytes else STR_TYPE) + (bytes(payload) if isbytes else payload.encode("utf8"))).digest()
+        value = self.current.get(key)
+
+        if value is None and self.previous:
+            value = self.previous.get(key)
+
+            if value is not None:
+                self._put(key, value)
+
+        if value is not None:
+            self.hits += 1
+            return value[1:] if value[:1] == BYTES_TYPE else value[1:].decode("utf8")
+
+        self.misses += 1
+        retVal = tamperchain(payload, tampers, **kwargs)
+
+        if isinstance(retVal, (bytes, bytearray)):
+            self._put(key, BYTES_TYPE + bytes(retVal))
+        else:
+            self._put(key, STR_TYPE + retVal.encode("utf8"))
+
+        return retVal
+
+    def close(self):
+        self.current.close()
+
+        if self.previous:
+            self.previous.close()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+Opt-in sampling profiler of tamper chains with collapsed-stack output
+
+A background thread periodically samples stacks of all threads running
+tamperchain(), attributing each sample to the chain and its current
+stage, with frames labeled by function, file and line (so time spent in
+regex calls, RNG calls or string concatenation inside a tamper gets its
+own tower). Output is in collapsed-stack format accepted by standard
+flamegraph tools (e.g. flamegraph.pl, speedscope, inferno). Sampling
+interval is backed off whenever the measured cost of sampling would
+exceed the overhead budget, so it can stay enabled on a production worker
+"""
+
+import collections
+import optparse
+import os
+import sys
+import threading
+
+import mytemper
+
+from mytemper import _timer
+
+# Default (minimal) sampling interval in seconds
+DEFAULT_INTERVAL = 0.005
+
+# Default overhead budget (fraction of wall time spent sampling)
+DEFAULT_BUDGET = 0.01
+
+class ChainProfiler(object):
+    """
+    Sampling profiler of tamper chains (to be used as context manager or
+    with start() and stop())
+
+    >>> with ChainProfiler(interval=0.001, budget=0.5) as profiler:
+    ...     for _ in range(2000):
+    ...         _ = mytemper.tamperchain('1 AND 1=1' * 20, ('space2comment', 'charencode'))
+    >>> profiler.collapsed().startswith('space2comment,charencode;')
+    True
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, budget=DEFAULT_BUDGET, lines=True):
+        self.minimum = self.interval = interval
+        self.budget = budget
+        self.lines = lines
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.cost = 0.0
+        self.elapsed = 0.0
+        self._labels = {}
+        self._event = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._event.clear()
+        self._start = _timer()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._event.set()
+        self._thread.join()
+        self.elapsed += _timer() - self._start
+
+    @property
+    def overhead(self):
+        """
+        Fraction of (profiled) wall time spent sampling
+        """
+
+        return self.cost / (self.elapsed or (_timer() - self._start) or 1)
+
+    def _label(self, frame):
+        code = frame.f_code
+        key = (code, (frame.f_lineno or 0) if self.lines else None)    # line number is not known for a frame being set up or torn down
+
+        if key not in self._labels:
+            self._labels[key] = "%s (%s%s)" % (code.co_name, os.path.basename(code.co_filename), ":%d" % key[1] if self.lines else "")
+
+        return self._labels[key]
+
+    def _sample(self):
+        own = threading.current_thread().ident
+        chain = mytemper.tamperchain.__code__
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+
+            stack = []
+
+            while frame is not None and frame.f_code is not chain:
+                stack.append(frame)
+                frame = frame.f_back
+
+            # outside of chain execution (or in between its stages)
+            if frame is None or not stack:
+                continue
+
+            locals_ = frame.f_locals
+            tampers, function = locals_.get("tampers"), locals_.get("function")
+            name = ",".join(getattr(_, "__name__", str(_)) for _ in tampers) if isinstance(tampers, (tuple, list)) else '-'
+
+            # time spent by the chain itself (e.g. resolving of stage properties) is attributed to tamperchain
+            if stack[-1].f_code is not getattr(function, "__code__", None):
+                stack.append(frame)
+
+            self.stacks[";".join([name] + [self._label(_) for _ in reversed(stack)])] += 1
+
+    def _run(self):
+        while not self._event.wait(self.interval):
+            start = _timer()
+            self._sample()
+            self.cost += _timer() - start
+            self.samples += 1
+
+            # sampling interval is backed off to keep (average) cost of sampling within the overhead budget
+            self.interval = max(self.minimum, self.cost / self.samples / self.budget)
+
+    def collapsed(self):
+        """
+        Returns collected stacks in collapsed-stack (flamegraph) format
+        """
+
+        return "\n".join("%s %d" % _ for _ in sorted(self.stacks.items()))
+
+    def stages(self):
+        """
+        Returns number of samples aggregated per (chain, stage)
+        """
+
+        retVal = collections.Counter()
+
+        for stack, count in self.stacks.items():
+            chain, stage = stack.split(';')[:2]
+            retVal[(chain, stage.split(' ')[0])] += count
+
+        return retVal
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] payload")
+    parser.add_option("--tamper", default="space2comment,charencode", help="Comma separated chain of tampers (default space2comment,charencode)")
+    parser.add_option("--count", type="int", default=10000, help="Number of chain runs (default 10000)")
+    parser.add_option("--interval", type="float", default=DEFAULT_INTERVAL, help="Minimal sampling interval in seconds (default %s)" % DEFAULT_INTERVAL)
+    parser.add_option("--budget", type="float", default=DEFAULT_BUDGET, help="Overhead budget as fraction of wall time (default %s)" % DEFAULT_BUDGET)
+    parser.add_option("--output", help="Write collapsed stacks to a given file instead of standard output")
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("missing payload")
+
+    tampers = options.tamper.split(',')
+    start = _timer()
+
+    for _ in range(options.count):
+        mytemper.tamperchain(args[0], tampers)
+
+    baseline = _timer() - start
+
+    with ChainProfiler(options.interval, options.budget) as profiler:
+        for _ in range(options.count):
+            mytemper.tamperchain(args[0], tampers)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write("%s\n" % profiler.collapsed())
+    else:
+        print(profiler.collapsed())
+
+    stages = profiler.stages()
+
+    for (chain, stage), count in sorted(stages.items(), key=lambda _: -_[1]):
+        sys.stderr.write("%-40s %-26s %6.1f%%\n" % (chain, stage, 100.0 * count / sum(stages.values())))
+
+    sys.stderr.write("samples: %d, sampling cost: %.2f%% of wall time (budget %.2f%%), slowdown: %.2f%%\n" % (profiler.samples, 100 * profiler.overhead, 100 * options.budget, 100 * (profiler.elapsed / baseline - 1)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Registry of tamper implementations
+
+Maps tamper names to "module:attribute" locations resolved (imported) when
+a tamper is looked up for the first time, so names can be pointed at other
+implementations (e.g. sqlmap's own tamper scripts). All bundled tampers
+live in mytemper, hence the first lookup of any of them imports it whole
+"""
+
+import importlib
+
+# Tamper name -> location ("module:attribute") of its implementation
+TAMPER_REGISTRY = dict((_, "mytemper:%s" % _) for _ in """
+apostrophemask apostrophenullencode appendnullbyte base64encode between bluecoat chardoubleencode charencode
+charunicodeencode concat2concatws equaltolike greatest halfversionedmorekeywords ifnull2ifisnull
+informationschemacomment lowercase modsecurityversioned modsecurityzeroversioned multiplespaces
+nonrecursivereplacement overlongutf8 percentage randomcase randomcomments securesphere sp_password space2comment
+space2dash space2hash space2morehash space2mssqlblank space2mysqldash space2plus space2randomblank
+symboliclogical unionalltounion unmagicquotes varnish versionedkeywords versionedmorekeywords xforwardedfor
+""".split())
+
+# Already resolved (imported) tamper functions
+_resolved = {}
+
+def registertamper(name, location):
+    """
+    Registers (or overrides) location of a tamper implementation (e.g.
+    "tamper.space2comment:tamper" for sqlmap's own tamper scripts)
+    """
+
+    TAMPER_REGISTRY[name] = location
+    _resolved.pop(name, None)
+
+def gettamper(name):
+    """
+    Returns tamper function for a given name (importing it if necessary)
+
+    >>> gettamper('space2plus')('SELECT id FROM users')
+    'SELECT+id+FROM+users'
+    """
+
+    if name not in _resolved:
+        try:
+            module, _, attribute = TAMPER_REGISTRY[name].partition(':')
+        except KeyError:
+            raise ValueError("unknown tamper '%s'" % name)
+
+        _resolved[name] = getattr(importlib.import_module(module), attribute or "tamper")
+
+    return _resolved[name]
+
+def tampernames():
+    """
+    Returns sorted names of registered tampers
+    """
+
+    return sorted(TAMPER_REGISTRY)
+
+def main():
+    import optparse
+
+    parser = optparse.OptionParser(description="Lists registered tampers with locations of their implementations")
+    parser.parse_args()
+
+    for name in tampernames():
+        print("%-28s %s" % (name, TAMPER_REGISTRY[name]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Lightweight (standalone) stand-in for sqlmap runtime globals used by tampers
+
+Used by mytemper when it is not running inside of sqlmap (lib.core.*)
+"""
+
+import random
+import string
+
+try:
+    xrange = xrange
+except NameError:
+    xrange = range
+
+# Character encoding used for the payload (bytes) conversions
+UNICODE_ENCODING = "utf8"
+
+# Keywords that would break if followed by a space (as in sqlmap's lib/core/settings.py)
+IGNORE_SPACE_AFFECTED_KEYWORDS = ("CAST", "COUNT", "EXTRACT", "GROUP_CONCAT", "MAX", "MID", "MIN", "SESSION_USER", "SUBSTR", "SUBSTRING", "SUM", "SYSTEM_USER", "TRIM")
+
+# SQL keywords (subset of sqlmap's txt/keywords.txt)
+SQL_KEYWORDS = """
+ABS ADD ALL ALTER AND ANY AS ASC ASCII AVG BEGIN BENCHMARK BETWEEN BIN BINARY BY CASE CAST CEIL CHAR CHARACTER
+CHAR_LENGTH CHR COALESCE COLLATE COLUMN CONCAT CONCAT_WS CONVERT COUNT CREATE CROSS CURRENT_DATE CURRENT_TIME
+CURRENT_TIMESTAMP CURRENT_USER CURSOR DATABASE DATE DECLARE DEFAULT DELAY DELETE DESC DISTINCT DROP ELSE ELT END
+EXCEPT EXEC EXECUTE EXISTS EXTRACT EXTRACTVALUE FALSE FETCH FIELD FLOOR FOR FROM FULL FUNCTION GRANT GREATEST
+GROUP GROUP_CONCAT HAVING HEX IF IFNULL IN INNER INSERT INSTR INTO IS ISNULL JOIN LEAST LEFT LENGTH LIKE LIMIT
+LOAD_FILE LOCATE LOWER LTRIM MAKE_SET MAX MD5 MID MIN MOD NOT NOW NULL NULLIF NVL OCT OFFSET ON OR ORD ORDER OUTER
+PG_SLEEP POSITION PROCEDURE RAND REGEXP REPEAT REPLACE REVERSE RIGHT RLIKE ROUND ROW ROWNUM RTRIM SCHEMA SELECT
+SESSION_USER SET SHA1 SLEEP SOUNDS SPACE SUBSTR SUBSTRING SUM SYSDATE SYSTEM_USER TABLE THEN TOP TRIM TRUE UNHEX
+UNION UNIQUE UPDATE UPDATEXML UPPER USER USING VALUES VERSION WAITFOR WHEN WHERE WHILE WITH XOR
+""".split()
+
+class _Keywords(object):
+    """
+    Keyword set loaded on first use
+    """
+
+    def __init__(self):
+        self._keywords = None
+
+    def _load(self):
+        if self._keywords is None:
+            self._keywords = frozenset(SQL_KEYWORDS)
+
+        return self._keywords
+
+    def __contains__(self, value):
+        return value in (self._keywords or self._load())
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+class _KnowledgeBase(object):
+    """
+    Minimal stand-in for sqlmap's kb (knowledge base) object
+    """
+
+    keywords = _Keywords()
+
+kb = _KnowledgeBase()
+
+_warnings = set()
+
+def randomRange(start=0, stop=1000):
+    """
+    Returns random integer value in a given range (inclusive)
+    """
+
+    return int(random.randint(start, stop))
+
+def randomInt(length=4):
+    """
+    Returns random integer value with a given number of digits
+    """
+
+    return int("".join(random.choice(string.digits if _ != 0 else string.digits.replace('0', '')) for _ in xrange(0, length)))
+
+def singleTimeWarnMessage(message):
+    """
+    Logs a given warning message only once
+    """
+
+    import logging
+
+    if message not in _warnings:
+        _warnings.add(message)
+        logging.getLogger("mytemper").warning(message)
@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+
+"""
+Deduplicating variant enumerator for randomized tamper chains
+
+Instead of calling randomized tampers in a loop and throwing away the
+duplicates (most of the output for short keywords like OR/AND), payload
+is split into literal parts and choice slots known from the tamper
+(per-keyword case masks for randomcase, per-gap comments for
+randomcomments, per-keyword padding for multiplespaces and per-space
+blanks for space2randomblank/space2mssqlblank). Variants are rendered
+directly from (distinct) slot choices, deduplicated by hash, while the
+size of the variant space tells how many of them can be requested at all
+"""
+
+import optparse
+import random
+import re
+import sys
+import time
+
+import mytemper
+
+from mytemper import _gettamper
+from mytemper import tamperchain
+from mytemper import tamperproperties
+
+# Spaces inserted by multiplespaces in front of and behind keywords
+PADDINGS = (' ', "  ", "   ")
+
+# Variant spaces up to this size are sampled without replacement from a shuffled list of indexes
+SHUFFLE_LIMIT = 1 << 20
+
+# Number of (random) calls per requested variant for tampers without known choice space
+FALLBACK_ATTEMPTS = 10
+
+class Template(object):
+    """
+    Payload split into literal parts and choice slots (shared by the
+    repeated occurrences of the same keyword), where a slot is a pair of
+    (number of choices, function returning choice for a given index) and
+    a part (slot, item) refers to an item of a (tuple) choice
+
+    >>> template = Template()
+    >>> slot = template.slot(2, lambda _: "ab"[_])
+    >>> template.parts.extend(("1", slot, "2", slot))
+    >>> template.size, template.render(1)
+    (2, '1b2b')
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.slots = []
+
+    def slot(self, size, choice):
+        """
+        Returns index of a new slot
+        """
+
+        self.slots.append((size, choice))
+
+        return len(self.slots) - 1
+
+    @property
+    def size(self):
+        retVal = 1
+
+        for size, _ in self.slots:
+            retVal *= size
+
+        return retVal
+
+    def render(self, index):
+        """
+        Returns variant for a given (mixed radix) index of slot choices
+        """
+
+        choices = []
+
+        for size, choice in self.slots:
+            index, _ = divmod(index, size)
+            choices.append(choice(_))
+
+        return "".join(choices[_] if isinstance(_, int) else choices[_[0]][_[1]] if isinstance(_, tuple) else _ for _ in self.parts)
+
+def _keyword(word):
+    return word.upper() in mytemper.kb.keywords
+
+def _literal(template, payload, start, end):
+    if end > start:
+        template.parts.append(payload[start:end])
+
+def _replace(template, word, size, choice):
+    """
+    Replaces all occurrences of a given word in literal parts of template
+    (including ones inside of other words) with a new slot, as str.replace()
+    of the tamper does, where (preceding) slots with choices containing the
+    word get merged with the new slot. Returns False if there are none
+    """
+
+    merged = [_ for _ in range(len(template.slots)) if any(word in item for __ in _choices(template.slots[_]) for item in __)]
+
+    if not merged and not any(word in _ for _ in template.parts if not isinstance(_, (int, tuple))):
+        return False
+
+    if merged:
+        offsets, choices = {}, [()]
+
+        for _ in merged:
+            offsets[_] = len(choices[0])
+            choices = [__ + item for __ in choices for item in _choices(template.slots[_])]
+
+        choices = sorted(set(tuple(_.replace(word, choice(index)) for _ in items) + (choice(index),) for items in choices for index in range(size)))
+        slot = template.slot(len(choices), choices.__getitem__)
+        target = (slot, len(choices[0]) - 1)
+
+        for _ in merged:
+            template.slots[_] = (1, lambda index: None)
+    else:
+        slot = target = template.slot(size, choice)
+
+    parts = []
+
+    for part in template.parts:
+        if not isinstance(part, (int, tuple)):
+            for _ in part.split(word):
+                parts.extend((_, target))
+
+            parts.pop()
+        elif merged and (part if isinstance(part, int) else part[0]) in merged:
+            parts.append((slot, offsets[part] if isinstance(part, int) else offsets[part[0]] + part[1]))
+        else:
+            parts.append(part)
+
+    template.parts = [_ for _ in parts if _ != ""]
+
+    return True
+
+def _choices(slot):
+    """
+    Returns all choices of a given slot as tuples
+    """
+
+    size, choice = slot
+
+    return [_ if isinstance(_, tuple) else (_,) for _ in (choice(index) for index in range(size)) if _ is not None]
+
+def _randomcase(payload):
+    """
+    Each keyword gets one of the case masks having both lower and upper
+    case letters, which (as in the tamper) replaces all occurrences of its
+    spelling not already replaced for the preceding keywords (see
+    _replace())
+
+    >>> sorted(Variants('or )Or', ('randomcase',)).enumerate())
+    ['Or )Or', 'oR )Or', 'oR )oR']
+    """
+
+    retVal, seen = Template(), set()
+
+    retVal.parts.append(payload)
+
+    for match in re.finditer(r"[A-Za-z_]+", payload):
+        word = match.group()
+        letters = [_ for _ in range(len(word)) if word[_].isalpha()]
+
+        if len(letters) < 2 or not _keyword(word) or word in seen:
+            continue
+
+        seen.add(word)
+
+        def choice(index, word=word.lower(), letters=letters):
+            mask = index + 1    # all lower and all upper case masks are skipped
+            return "".join(word[i].upper() if i in letters and mask >> letters.index(i) & 1 else word[i] for i in range(len(word)))
+
+        _replace(retVal, word, 2 ** len(letters) - 2, choice)
+
+    return retVal
+
+def _randomcomments(payload):
+    """
+    Each keyword gets comments in one of the non-empty subsets of inner
+    gaps (the last one excluded) or in the last gap alone, which (as in
+    the tamper) replaces all occurrences of its spelling not already
+    replaced for the preceding keywords (see _replace())
+
+    >>> Variants('AS ASCII', ('randomcomments',)).size
+    1
+    >>> sorted(Variants('ORD OR', ('randomcomments',)).enumerate())
+    ['O/**/R/**/D O/**/R', 'O/**/RD O/**/R']
+    >>> variants = Variants('SELECT ASCII(1) AS a', ('randomcomments',))
+    >>> variants.size, 'S/**/ELECT A/**/S/**/CII(1) A/**/S a' in set(variants.enumerate())
+    (80, True)
+    """
+
+    retVal, seen = Template(), set()
+
+    retVal.parts.append(payload)
+
+    for match in re.finditer(r"\b[A-Za-z_]+\b", payload):
+        word = match.group()
+
+        if len(word) < 2 or not _keyword(word) or word in seen:
+            continue
+
+        seen.add(word)
+
+        def choice(index, word=word):
+            gaps = set(i + 1 for i in range(len(word) - 2) if index + 1 >> i & 1) if index < 2 ** (len(word) - 2) - 1 else set((len(word) - 1,))
+            return "".join(("/**/" if i in gaps else "") + word[i] for i in range(len(word)))
+
+        _replace(retVal, word, 2 ** (len(word) - 2), choice)
+
+    return retVal
+
+def _multiplespaces(payload):
+    """
+    Each keyword gets 1-3 spaces in front of it and, if it's not a function
+    call, 1-3 spaces behind it (same for all of its occurrences). Paddings
+    meeting in the same run of spaces (e.g. behind UNION and in front of
+    SELECT) share a slot choosing between distinct lengths of their runs
+    """
+
+    retVal, index, occurrences = Template(), 0, []
+    runs, run = [], None
+
+    for word in set(_.group() for _ in re.finditer(r"[A-Za-z_]+", payload) if _keyword(_.group())):
+        occurrences.extend((_.start(), _.end(), False) for _ in re.finditer(r"(?<=\W)%s(?=[^A-Za-z_(]|\Z)" % word, payload))
+        occurrences.extend((_.start(), _.end(), True) for _ in re.finditer(r"(?<=\W)%s(?=[(])" % word, payload))
+
+    # sequence of literals and paddings (keys), where paddings and spaces between them form runs [constant, keys]
+    sequence = []
+
+    for start, end, function in sorted(occurrences):
+        word = payload[start:end]
+        sequence.extend((payload[index:start], (word, function, "before"), word))
+
+        if not function:
+            sequence.append((word, function, "behind"))
+
+        index = end
+
+    sequence.append(payload[index:])
+
+    for item in sequence:
+        if isinstance(item, tuple):
+            if run is None:
+                run = [0, []]
+                runs.append(run)
+                retVal.parts.append(run)
+
+            run[1].append(item)
+        elif run is not None and not item.strip(' '):
+            run[0] += len(item)
+        else:
+            run = None
+
+            if item:
+                retVal.parts.append(item)
+
+    # runs sharing a padding (key) are grouped into components with a slot of distinct tuples of run lengths
+    components = []
+
+    for run in runs:
+        merged = [_ for _ in components if set(_[1]) & set(run[1])]
+        component = ([run], set(run[1]))
+
+        for _ in merged:
+            components.remove(_)
+            component[0].extend(_[0])
+            component[1].update(_[1])
+
+        components.append(component)
+
+    for members, keys in components:
+        states = set([tuple(_[0] for _ in members)])
+
+        for key in keys:
+            states = set(tuple(state[i] + len(padding) * members[i][1].count(key) for i in range(len(members))) for state in states for padding in PADDINGS)
+
+        choices = [tuple(' ' * _ for _ in state) for state in sorted(states)]
+        slot = retVal.slot(len(choices), choices.__getitem__)
+
+        for i in range(len(members)):
+            members[i].append((slot, i))
+
+    retVal.parts = [_[2] if isinstance(_, list) else _ for _ in retVal.parts]
+
+    return retVal
+
+def _blanks(payload, blanks, trailing=None):
+    """
+    The first whitespace and each space outside of quotes get one of the
+    blanks (trailing ones after the comment mark, if given)
+    """
+
+    retVal, index = Template(), 0
+    quote, doublequote, firstspace, end = False, False, False, False
+
+    for i in range(len(payload)):
+        if not firstspace:
+            if not payload[i].isspace():
+                continue
+
+            firstspace = True
+
+        elif payload[i] == '\'':
+            quote = not quote
+            continue
+
+        elif payload[i] == '"':
+            doublequote = not doublequote
+            continue
+
+        elif trailing and (payload[i] == '#' or payload[i:i + 3] == "-- "):
+            end = True
+            continue
+
+        elif payload[i] != ' ' or doublequote or quote:
+            continue
+
+        _ = trailing if end else blanks
+        _literal(retVal, payload, index, i)
+        retVal.parts.append(retVal.slot(len(_), _.__getitem__))
+        index = i + 1
+
+    _literal(retVal, payload, index, len(payload))
+
+    return retVal
+
+# Builders of variant templates for randomized tampers with known choice space
+TEMPLATE_BUILDERS = {
+    "randomcase": _randomcase,
+    "randomcomments": _randomcomments,
+    "multiplespaces": _multiplespaces,
+    "space2randomblank": lambda payload: _blanks(payload, mytemper.RANDOM_BLANKS),
+    "space2mssqlblank": lambda payload: _blanks(payload, mytemper.MSSQL_BLANKS, mytemper.MSSQL_BLANKS[:-1]),
+}
+
+class Variants(object):
+    """
+    Variant space of a payload for a given chain of tampers, where each
+    randomized stage with known choice space gets its template built from
+    the output of the preceding stages (size of the space is calculated
+    along the first variant, hence it's exact when choice spaces of later
+    stages don't depend on earlier choices, e.g. randomcase followed by
+    space2randomblank)
+
+    >>> variants = Variants('1 OR 2>1', ('randomcase',))
+    >>> variants.size
+    2
+    >>> sorted(variants.sample(10))
+    ['1 Or 2>1', '1 oR 2>1']
+    """
+
+    def __init__(self, payload, tampers):
+        self.payload = payload
+        self.tampers = tuple(_gettamper(_) for _ in tampers if not tamperproperties(_)["headers"])
+        self.opaque = any(not tamperproperties(_)["deterministic"] and _.__name__ not in TEMPLATE_BUILDERS for _ in self.tampers)
+        self._nodes = {}
+        self.size = None if self.opaque else self._size(self._node(payload, 0))
+
+    def _node(self, payload, stage):
+        """
+        Returns (payload, template, stage of the following tampers) with
+        deterministic tampers in front of the next randomized one applied
+        """
+
+        key = (payload, stage)
+
+        if key in self._nodes:
+            return self._nodes[key]
+
+        start = stage
+
+        while stage < len(self.tampers) and self.tampers[stage].__name__ not in TEMPLATE_BUILDERS:
+            stage += 1
+
+        payload = tamperchain(payload, self.tampers[start:stage]) if stage > start else payload
+
+        if stage == len(self.tampers):
+            return payload, None, stage
+
+        # only nodes with templates are kept (final variants are not)
+        retVal = self._nodes[key] = (payload, TEMPLATE_BUILDERS[self.tampers[stage].__name__](payload), stage + 1)
+
+        return retVal
+
+    def _size(self, node):
+        payload, template, stage = node
+
+        if template is None:
+            return 1
+        else:
+            return template.size * self._size(self._node(template.render(0), stage))
+
+    def render(self, index):
+        """
+        Returns variant for a given index (0 <= index < size)
+        """
+
+        payload, template, stage = self._node(self.payload, 0)
+
+        while template is not None:
+            index, _ = divmod(index, template.size)
+            payload, template, stage = self._node(template.render(_), stage)
+
+        return payload
+
+    def _indexes(self, rand):
+        if self.size <= SHUFFLE_LIMIT:
+            retVal = list(range(self.size))
+            rand.shuffle(retVal)
+
+            for _ in retVal:
+                yield _
+        else:
+            seen = set()
+
+            while len(seen) < SHUFFLE_LIMIT:
+                _ = rand.randrange(self.size)
+
+                if _ not in seen:
+                    seen.add(_)
+                    yield _
+
+    def sample(self, count, seed=None):
+        """
+        Yields up to a given count of distinct (random) variants
+        """
+
+        rand = random.Random(seed)
+        seen = set()
+
+        if self.opaque:
+            candidates = (tamperchain(self.payload, self.tampers) for _ in range(count * FALLBACK_ATTEMPTS))
+        else:
+            candidates = (self.render(_) for _ in self._indexes(rand))
+
+        for variant in candidates:
+            if len(seen) >= count:
+                break
+
+            if hash(variant) not in seen:
+                seen.add(hash(variant))
+                yield variant
+
+    def enumerate(self):
+        """
+        Yields all distinct variants (in index order)
+        """
+
+        if self.opaque:
+            raise ValueError("choice space of chain '%s' is not known" % ",".join(_.__name__ for _ in self.tampers))
+
+        seen = set()
+
+        for index in range(self.size):
+            variant = self.render(index)
+
+            if hash(variant) not in seen:
+                seen.add(hash(variant))
+                yield variant
+
+def benchmark(payload, tampers, count):
+    """
+    Returns (distinct variants, seconds) for the naive loop (calling
+    tampers and throwing away duplicates) and for the enumerator
+    """
+
+    retVal = []
+    start, seen, calls = time.time(), set(), 0
+    limit = min(count, Variants(payload, tampers).size or count)
+
+    while len(seen) < limit and calls < count * FALLBACK_ATTEMPTS:
+        seen.add(tamperchain(payload, tampers))
+        calls += 1
+
+    retVal.append((len(seen), time.time() - start))
+
+    start = time.time()
+    retVal.append((len(list(Variants(payload, tampers).sample(count))), time.time() - start))
+
+    return retVal
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] payload")
+    parser.add_option("--tamper", default="randomcase", help="Comma separated chain of tampers (default randomcase)")
+    parser.add_option("--count", type="int", default=10, help="Number of variants (default 10)")
+    parser.add_option("--seed", type="int", help="Seed used for sampling")
+    parser.add_option("--benchmark", action="store_true", help="Compare against the naive (call and deduplicate) loop")
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("missing payload")
+
+    tampers = options.tamper.split(',')
+    variants = Variants(args[0], tampers)
+
+    if options.benchmark:
+        (naive, naiveElapsed), (enumerated, elapsed) = benchmark(args[0], tampers, options.count)
+        print("%-12s %10s %12s" % ("method", "variants", "msec"))
+        print("%-12s %10d %12.2f" % ("naive", naive, 1e3 * naiveElapsed))
+        print("%-12s %10d %12.2f" % ("enumerator", enumerated, 1e3 * elapsed))
+    else:
+        for variant in variants.sample(options.count, options.seed):
+            print(variant)
+
+    sys.stderr.write("variant space size: %s\n" % ("unknown" if variants.size is None else variants.size))
+
+if __name__ == "__main__":
+    main()